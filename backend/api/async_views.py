@@ -0,0 +1,241 @@
+import asyncio
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import Page
+from django.db import close_old_connections
+from django.http import Http404, HttpResponse
+from django.urls import path, re_path
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import APIException, NotFound
+
+from recipes.models import Recipes
+
+from .cache import recipe_responses
+from .fast import ingredient_dicts, recipe_dicts, subscription_dicts
+from .overlay import personalize, user_flags
+from .renderers import render_json
+from .views import ingredients_cache, tags_cache
+
+# Асинхронные обработчики самых частых GET-запросов для ASGI
+# (API_ASYNC_VIEWS). Django 3.2 не умеет асинхронных запросов к базе,
+# поэтому ORM и кэш работают в пуле потоков, а независимые запросы —
+# COUNT(*), страница и отметки пользователя — идут одновременно. Ответы
+# совпадают с ответами ViewSet; всё остальное, включая ошибки и запись,
+# обрабатывают прежние синхронные ViewSet.
+
+
+def run_sync(func, *args, **kwargs):
+    """Синхронный вызов в пуле потоков, параллельно с другими.
+
+    У каждого потока своё соединение с базой: до и после вызова оно
+    проверяется так же, как в начале и в конце запроса, чтобы соблюдать
+    CONN_MAX_AGE.
+    """
+    def call():
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)()
+
+
+def make_view(sync_view, request, kwargs):
+    """ViewSet, прошедший initial(): аутентификация, права, формат ответа.
+
+    Экземпляр создаётся так же, как в ViewSetMixin.as_view, с параметрами
+    маршрута из router и @action.
+    """
+    view = sync_view.cls(**sync_view.initkwargs)
+    view.action_map = sync_view.actions
+    for method, action in sync_view.actions.items():
+        setattr(view, method, getattr(view, action))
+    if hasattr(view, 'get') and not hasattr(view, 'head'):
+        view.head = view.get
+    view.args, view.kwargs = (), kwargs
+    view.request = view.initialize_request(request, **kwargs)
+    view.headers = view.default_response_headers
+    view.initial(view.request, **kwargs)
+    if view.request.accepted_renderer.format != 'json':
+        raise NotFound
+    return view
+
+
+def finalize(view, response):
+    """Заголовки, которые добавил бы APIView.finalize_response."""
+    for name, value in view.headers.items():
+        if name == 'Vary':
+            patch_vary_headers(response, (value,))
+        else:
+            response[name] = value
+    return response
+
+
+def json_response(data):
+    return HttpResponse(render_json(data), content_type='application/json')
+
+
+def async_read(handler, sync_view):
+    """GET обрабатывает асинхронный handler(view, **kwargs), остальное — DRF.
+
+    sync_view — представление ViewSet из router для того же адреса. Если
+    handler не может ответить сам (другой формат, ошибка клиента, нет
+    объекта), запрос целиком повторяет sync_view: он и формирует ответ с
+    ошибкой.
+    """
+    @wraps(handler)
+    async def view(request, **kwargs):
+        if request.method == 'GET':
+            try:
+                api_view = await run_sync(make_view, sync_view, request,
+                                          kwargs)
+                return finalize(api_view, await handler(api_view, **kwargs))
+            except (APIException, Http404):
+                pass
+        return await sync_to_async(sync_view)(request, **kwargs)
+    # csrf_exempt из Django 3.2 не поддерживает асинхронные функции.
+    view.csrf_exempt = True
+    view.sync_view = sync_view
+    return view
+
+
+async def paginate(paginator, queryset, request):
+    """paginator.paginate_queryset с COUNT(*) одновременно со страницей.
+
+    Курсорная пагинация COUNT(*) не делает и выполняется как есть.
+    """
+    if paginator.cursor_query_param in request.query_params:
+        return await run_sync(
+            lambda: list(paginator.paginate_queryset(queryset, request))
+        )
+    paginator.cursor_mode = False
+    page_size = paginator.get_page_size(request)
+    number = request.query_params.get(paginator.page_query_param, '1')
+    if not number.isdigit() or int(number) < 1:
+        raise NotFound
+    number = int(number)
+    offset = (number - 1) * page_size
+    count, objects = await asyncio.gather(
+        run_sync(queryset.count),
+        run_sync(lambda: list(queryset[offset:offset + page_size]))
+    )
+    django_paginator = paginator.django_paginator_class(queryset, page_size)
+    django_paginator.count = count
+    if number > django_paginator.num_pages:
+        raise NotFound
+    paginator.page = Page(objects, number, django_paginator)
+    paginator.request = request
+    return objects
+
+
+async def load_flags(request):
+    if request.user.is_anonymous:
+        return None
+    return await run_sync(user_flags.get, request.user.pk)
+
+
+def shared_representations(request, ids):
+    return run_sync(recipe_responses.representations, request, ids,
+                    partial(recipe_dicts, request))
+
+
+def assemble(ids, representations, flags):
+    """Как RecipesViewSet.representations."""
+    recipes = [representations[pk] for pk in ids if pk in representations]
+    if flags is None:
+        return recipes
+    return [personalize(recipe, flags) for recipe in recipes]
+
+
+async def recipe_page(view):
+    request = view.request
+    queryset = Recipes.objects.only('pk', 'pub_date')
+    if request.user.is_authenticated:
+        queryset = view.annotate_flags(queryset)
+    queryset = await run_sync(view.filter_queryset, queryset)
+
+    async def page():
+        ids = [recipe.pk for recipe in await paginate(
+            view.paginator, queryset, request
+        )]
+        return ids, await shared_representations(request, ids)
+
+    (ids, representations), flags = await asyncio.gather(
+        page(), load_flags(request)
+    )
+    return view.paginator.get_paginated_response(
+        assemble(ids, representations, flags)
+    ).data
+
+
+async def recipe_list(view):
+    request = view.request
+    if not recipe_responses.list_cacheable(request):
+        return json_response(await recipe_page(view))
+    key, content = await run_sync(recipe_responses.cached_list, request)
+    if content is not None:
+        return recipe_responses.response(content, 'HIT')
+    content = render_json(await recipe_page(view))
+    await run_sync(recipe_responses.store_list, key, content)
+    return recipe_responses.response(content, 'MISS')
+
+
+async def recipe_detail(view, pk):
+    request = view.request
+    pk = int(pk)
+    cacheable = recipe_responses.cacheable(request)
+    if cacheable:
+        key, tag, content = await run_sync(
+            recipe_responses.cached_detail, request, pk
+        )
+        if content is not None:
+            return recipe_responses.response(content, 'HIT')
+    representations, flags = await asyncio.gather(
+        shared_representations(request, [pk]), load_flags(request)
+    )
+    recipes = assemble([pk], representations, flags)
+    if not recipes:
+        raise Http404
+    if not cacheable:
+        return json_response(recipes[0])
+    content = render_json(recipes[0])
+    await run_sync(recipe_responses.store_detail, key, tag, content)
+    return recipe_responses.response(content, 'MISS')
+
+
+async def tag_list(view):
+    return await run_sync(tags_cache.response, view.request)
+
+
+async def ingredient_list(view):
+    if not view.request.query_params:
+        return await run_sync(ingredients_cache.response, view.request)
+    return json_response(await run_sync(
+        lambda: ingredient_dicts(view.filter_queryset(view.get_queryset()))
+    ))
+
+
+async def subscriptions(view):
+    authors = await paginate(
+        view.paginator, view.subscribed_authors(), view.request
+    )
+    data = await run_sync(
+        subscription_dicts, authors, view.author_recipes(authors)
+    )
+    return json_response(view.get_paginated_response(data).data)
+
+
+def urlpatterns(router):
+    """Маршруты перед маршрутами router: GET здесь, прочее — те же ViewSet."""
+    views = {pattern.name: pattern.callback for pattern in router.urls}
+    return [
+        path('recipes/', async_read(recipe_list, views['recipes-list'])),
+        re_path(r'^recipes/(?P<pk>\d+)/$',
+                async_read(recipe_detail, views['recipes-detail'])),
+        path('tags/', async_read(tag_list, views['tags-list'])),
+        path('ingredients/',
+             async_read(ingredient_list, views['ingredients-list'])),
+        path('users/subscriptions/',
+             async_read(subscriptions, views['users-subscriptions'])),
+    ]
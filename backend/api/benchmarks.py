@@ -0,0 +1,541 @@
+import json
+import random
+import time
+from contextlib import contextmanager, nullcontext
+from itertools import accumulate
+
+from asgiref.sync import async_to_sync
+from django.db import connection, transaction
+from django.db.models import (BooleanField, Count, Exists, OuterRef, Prefetch,
+                              Sum, Value)
+from django.test import RequestFactory
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from recipes.models import (Ingredient, IngredientsList, Recipes,
+                            ShoppingCartTotal, Tag)
+from users.models import Subscribe, User
+
+from . import async_views
+from .cache import recipes_list_generation, users_generation
+from .compression import brotli, compress
+from .constants import DEFAULT_PAGE_SIZE
+from .fast import ingredient_dicts, recipe_dicts, subscription_dicts, tag_dicts
+from .profiling import Profile
+from .renderers import FastJSONRenderer, orjson
+from .search import CookableIndex
+from .serializers import (IngredientSerializer, RecipeSerializer,
+                          SubscribeSerializer, TagSerializer)
+from .urls import router
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def decorator(func):
+        SCENARIOS[name] = func
+        return func
+    return decorator
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = round(percent / 100 * (len(values) - 1))
+    return values[min(len(values) - 1, index)]
+
+
+def timings_report(title, timings):
+    timings = [timing * 1000 for timing in timings]
+    return (
+        f'{title}: n={len(timings)} '
+        f'p50={percentile(timings, 50):.2f}ms '
+        f'p99={percentile(timings, 99):.2f}ms '
+        f'max={max(timings):.2f}ms'
+    )
+
+
+def budget_report(title, timings, queries, budget):
+    """Строка замера рядом с бюджетом.
+
+    budget — пара (наибольшее число SQL-запросов, предельный p99 в мс).
+    Соблюдение бюджетов проверяет tests/test_budgets.py.
+    """
+    max_queries, max_p99 = budget
+    return (f'{timings_report(title, timings)} '
+            f'queries={max(queries)} (бюджет {max_queries}, {max_p99}ms)')
+
+
+def measure(client, url, samples, **params):
+    timings, queries = [], []
+    client.get(url, params)
+    for _ in range(samples):
+        start = time.perf_counter()
+        with Profile().record() as profile:
+            response = client.get(url, params)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        timings.append(time.perf_counter() - start)
+        queries.append(profile.queries)
+        assert response.status_code == 200, (url, response.status_code)
+    return timings, queries
+
+
+def benchmark_user():
+    """Пользователь с наибольшим числом подписок и покупок."""
+    return User.objects.annotate(
+        subscriptions=Count('followers', distinct=True),
+        carts=Count('shopping_cart', distinct=True)
+    ).filter(subscriptions__gt=0, carts__gt=0).order_by(
+        '-subscriptions', '-carts'
+    ).first()
+
+
+def get_client(user=None):
+    client = APIClient(SERVER_NAME='localhost')
+    if user is not None:
+        client.force_authenticate(user)
+    return client
+
+
+@scenario('autocomplete')
+def autocomplete(stdout, samples, **options):
+    client = get_client()
+    names = Ingredient.objects.order_by('?').values_list(
+        'name', flat=True
+    )[:samples]
+    timings = []
+    results = 0
+    for name in names:
+        for length in range(1, min(len(name), 10) + 1):
+            start = time.perf_counter()
+            response = client.get('/api/ingredients/', {'name': name[:length]})
+            timings.append(time.perf_counter() - start)
+            results += len(response.json())
+    if not timings:
+        stdout.write('Нет ингредиентов: сначала выполните load_data.')
+        return
+    stdout.write(timings_report('GET /api/ingredients/?name=', timings))
+    stdout.write(f'в среднем результатов: {results / len(timings):.1f}')
+
+
+# Бюджеты (SQL-запросы, p99 в мс). Число запросов не должно расти
+# с размером страницы: рост означает N+1.
+BUDGETS = {
+    'recipes_list': (6, 500),
+    'recipe_detail': (6, 250),
+    'subscriptions': (4, 200),
+    'download_shopping_cart': (2, 200),
+    'anonymous_cache': (0, 50),
+    # Только COUNT и id страницы.
+    'personalized_cache': (2, 100),
+}
+
+
+def run_budget(stdout, name, url, samples, user=None, **params):
+    if user is None:
+        user = benchmark_user()
+    if user is None:
+        stdout.write('Нет данных: запустите benchmark с --seed.')
+        return
+    client = get_client(user)
+    timings, queries = measure(client, url, samples, **params)
+    stdout.write(
+        budget_report(f'GET {url}', timings, queries, BUDGETS[name])
+    )
+
+
+@scenario('recipes_list')
+def recipes_list(stdout, samples, **options):
+    run_budget(stdout, 'recipes_list', '/api/recipes/', samples,
+               limit=50)
+
+
+@scenario('recipe_detail')
+def recipe_detail(stdout, samples, **options):
+    recipe = Recipes.objects.order_by('-pub_date').first()
+    if recipe is None:
+        stdout.write('Нет рецептов: запустите benchmark с --seed.')
+        return
+    run_budget(stdout, 'recipe_detail', f'/api/recipes/{recipe.pk}/',
+               samples)
+
+
+@scenario('subscriptions')
+def subscriptions(stdout, samples, **options):
+    run_budget(stdout, 'subscriptions', '/api/users/subscriptions/',
+               samples, limit=50, recipes_limit=3)
+
+
+@scenario('download_shopping_cart')
+def download_shopping_cart(stdout, samples, **options):
+    run_budget(stdout, 'download_shopping_cart',
+               '/api/recipes/download_shopping_cart/', samples)
+
+
+def cache_budget(stdout, name, client, generation, samples):
+    """Список рецептов без кэша (после смены версии) и из кэша."""
+    params = {'limit': 50}
+    cold = []
+    for _ in range(samples):
+        generation.bump()
+        start = time.perf_counter()
+        client.get('/api/recipes/', params)
+        cold.append(time.perf_counter() - start)
+    stdout.write(timings_report('GET /api/recipes/ (промах кэша)', cold))
+    timings, queries = measure(client, '/api/recipes/', samples, **params)
+    stdout.write(budget_report(
+        'GET /api/recipes/ (из кэша)', timings, queries, BUDGETS[name]
+    ))
+
+
+@scenario('anonymous_cache')
+def anonymous_cache(stdout, samples, **options):
+    cache_budget(stdout, 'anonymous_cache', get_client(),
+                 recipes_list_generation, samples)
+
+
+@scenario('personalized_cache')
+def personalized_cache(stdout, samples, **options):
+    """Общие представления рецептов с отметками пользователя."""
+    user = benchmark_user()
+    if user is None:
+        stdout.write('Нет данных: запустите benchmark с --seed.')
+        return
+    cache_budget(stdout, 'personalized_cache', get_client(user),
+                 users_generation, samples)
+
+
+@scenario('search')
+def search(stdout, samples, **options):
+    client = get_client()
+    names = Recipes.objects.order_by('?').values_list(
+        'name', flat=True
+    )[:samples]
+    timings = []
+    for name in names:
+        start = time.perf_counter()
+        client.get('/api/recipes/', {'search': name.split()[0], 'limit': 6})
+        timings.append(time.perf_counter() - start)
+    if not timings:
+        stdout.write('Нет рецептов: запустите benchmark с --seed.')
+        return
+    stdout.write(timings_report('GET /api/recipes/?search=', timings))
+
+
+COOKABLE_RECIPES = 100000
+COOKABLE_INGREDIENTS = 2000
+
+
+@scenario('cookable')
+def cookable(stdout, samples, **options):
+    """Индекс на синтетических 100 тысячах рецептов, затем API на базе."""
+    rng = random.Random(0)
+    # Частые ингредиенты (соль, масло) встречаются в рецептах чаще.
+    weights = [1 / (rank + 1) for rank in range(COOKABLE_INGREDIENTS)]
+    ingredients = range(COOKABLE_INGREDIENTS)
+    weights = list(accumulate(weights))
+    rows = [
+        (recipe, ingredient)
+        for recipe in range(1, COOKABLE_RECIPES + 1)
+        for ingredient in rng.choices(ingredients, cum_weights=weights, k=8)
+    ]
+    index = CookableIndex()
+    start = time.perf_counter()
+    index.build(iter(rows))
+    elapsed = time.perf_counter() - start
+    size = sum(
+        len(values) * values.itemsize
+        for values in (*index.postings.values(), *index.recipes.values(),
+                       index.sizes)
+    )
+    stdout.write(f'построение индекса на {COOKABLE_RECIPES} рецептов: '
+                 f'{elapsed:.2f} с, массивы {size / 2 ** 20:.1f} МБ')
+    timings = []
+    for _ in range(samples):
+        pantry = rng.choices(ingredients, cum_weights=weights, k=15)
+        start = time.perf_counter()
+        index.rank(pantry)[:DEFAULT_PAGE_SIZE]
+        timings.append(time.perf_counter() - start)
+    stdout.write(timings_report('CookableIndex.rank, 15 ингр.', timings))
+    recipe = Recipes.objects.order_by('?').first()
+    if recipe is None:
+        return
+    pantry = list(recipe.ingredients.values_list('pk', flat=True))
+    client = get_client()
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        client.get('/api/recipes/cookable/', {'ingredients': pantry})
+        timings.append(time.perf_counter() - start)
+    stdout.write(timings_report('GET /api/recipes/cookable/', timings))
+
+
+def drf_recipes(request, ids):
+    recipes = list(Recipes.objects.filter(pk__in=ids).select_related(
+        'author'
+    ).prefetch_related('tags', Prefetch(
+        'ingredient',
+        queryset=IngredientsList.objects.select_related(
+            'ingredients'
+        ).order_by('pk')
+    )))
+    for recipe in recipes:
+        recipe.is_favorited = recipe.is_in_shopping_cart = False
+        recipe.author.is_subscribed = False
+    data = RecipeSerializer(
+        recipes, many=True, context={'request': request}
+    ).data
+    return {item['id']: item for item in data}
+
+
+def drf_subscriptions(user):
+    authors = User.objects.filter(authors__user=user).annotate(
+        is_subscribed=Value(True, output_field=BooleanField())
+    ).prefetch_related(
+        Prefetch('recipes', to_attr='recipes_preview')
+    ).order_by('username')
+    return SubscribeSerializer(authors, many=True).data
+
+
+def fast_subscriptions(user):
+    authors = list(User.objects.filter(authors__user=user).order_by(
+        'username'
+    ))
+    return subscription_dicts(
+        authors, Recipes.objects.filter(author__in=authors)
+    )
+
+
+def by_id(items):
+    return sorted(items, key=lambda item: item['id'])
+
+
+def normalized(recipes):
+    # Порядок тегов и ингредиентов сериализатор не задаёт.
+    return {
+        pk: dict(recipe, tags=by_id(recipe['tags']),
+                 ingredients=by_id(recipe['ingredients']))
+        for pk, recipe in recipes.items()
+    }
+
+
+@scenario('fast_serializers')
+def fast_serializers(stdout, samples, **options):
+    """Совпадение api/fast.py с сериализаторами DRF и выигрыш в скорости."""
+    request = RequestFactory(SERVER_NAME='localhost').get('/api/recipes/')
+    ids = list(Recipes.objects.values_list('pk', flat=True)[:50])
+    user = benchmark_user()
+    pairs = {
+        'рецепты': (
+            lambda: normalized(drf_recipes(request, ids)),
+            lambda: normalized(recipe_dicts(request, ids)),
+            len(ids),
+        ),
+        'теги': (
+            lambda: TagSerializer(Tag.objects.all(), many=True).data,
+            lambda: tag_dicts(Tag.objects.all()),
+            Tag.objects.count(),
+        ),
+        'ингредиенты': (
+            lambda: IngredientSerializer(
+                Ingredient.objects.all()[:1000], many=True
+            ).data,
+            lambda: ingredient_dicts(Ingredient.objects.all()[:1000]),
+            min(1000, Ingredient.objects.count()),
+        ),
+    }
+    if user is not None:
+        pairs['подписки'] = (
+            lambda: drf_subscriptions(user),
+            lambda: fast_subscriptions(user),
+            user.subscriptions,
+        )
+    violations = []
+    for name, (drf, fast, count) in pairs.items():
+        if drf() != fast():
+            violations.append(f'{name}: ответ отличается от DRF')
+        timings = {}
+        for label, build in (('DRF', drf), ('fast', fast)):
+            start = time.perf_counter()
+            for _ in range(samples):
+                build()
+            timings[label] = (time.perf_counter() - start) / samples
+        stdout.write(
+            f'{name} ({count} шт.): DRF {timings["DRF"] * 1000:.2f}ms, '
+            f'fast {timings["fast"] * 1000:.2f}ms, '
+            f'x{timings["DRF"] / timings["fast"]:.1f}'
+        )
+    return violations
+
+
+@scenario('json')
+def json_encoding(stdout, samples, **options):
+    """Размер и время кодирования страницы рецептов и списка ингредиентов."""
+    request = RequestFactory(SERVER_NAME='localhost').get('/api/recipes/')
+    ids = list(Recipes.objects.values_list('pk', flat=True)[:50])
+    payloads = {
+        f'рецепты ({len(ids)} шт.)': list(recipe_dicts(request, ids).values()),
+        'ингредиенты': ingredient_dicts(Ingredient.objects.all()),
+    }
+    escaped = JSONRenderer()
+    escaped.ensure_ascii = True
+    encoders = {
+        'json ensure_ascii': escaped.render,
+        'json utf-8': JSONRenderer().render,
+    }
+    if orjson is not None:
+        encoders['orjson'] = FastJSONRenderer().render
+    for title, data in payloads.items():
+        stdout.write(f'{title}:')
+        for name, encode in encoders.items():
+            start = time.perf_counter()
+            for _ in range(samples):
+                content = encode(data)
+            elapsed = (time.perf_counter() - start) / samples
+            stdout.write(f'  {name:<18} {len(content) / 1024:>9.1f} КБ '
+                         f'{elapsed * 1000:>8.2f}ms')
+        for encoding in ('gzip', 'br') if brotli else ('gzip',):
+            start = time.perf_counter()
+            compressed = compress(content, encoding)
+            elapsed = time.perf_counter() - start
+            stdout.write(f'  + {encoding:<16} {len(compressed) / 1024:>9.1f} '
+                         f'КБ {elapsed * 1000:>8.2f}ms')
+
+
+def response_json(response):
+    if hasattr(response, 'render'):
+        response.render()
+    return response.status_code, json.loads(response.content)
+
+
+@scenario('async_views')
+def async_read_views(stdout, samples, **options):
+    """Ответы api/async_views.py совпадают с ViewSet; время обоих путей."""
+    recipe = Recipes.objects.first()
+    user = benchmark_user()
+    if recipe is None or user is None:
+        stdout.write('Нет данных: запустите benchmark с --seed.')
+        return []
+    token, _ = Token.objects.get_or_create(user=user)
+    auth = {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+    detail = f'/api/recipes/{recipe.pk}/'
+    cases = (
+        ('рецепты', '/api/recipes/', {'limit': 6}, {}),
+        ('рецепты, стр. 2', '/api/recipes/', {'limit': 6, 'page': 2}, {}),
+        ('рецепты, курсор', '/api/recipes/', {'limit': 6, 'cursor': ''}, {}),
+        ('рецепт', detail, {}, {}),
+        ('теги', '/api/tags/', {}, {}),
+        ('ингредиенты', '/api/ingredients/', {'name': 'а'}, {}),
+        ('рецепты, пользователь', '/api/recipes/',
+         {'limit': 6, 'is_favorited': 1}, auth),
+        ('рецепт, пользователь', detail, {}, auth),
+        ('подписки', '/api/users/subscriptions/', {'recipes_limit': 3}, auth),
+        # Ошибки отдаёт ViewSet.
+        ('нет страницы', '/api/recipes/', {'page': 10 ** 6}, {}),
+        ('подписки без токена', '/api/users/subscriptions/', {}, {}),
+    )
+    patterns = async_views.urlpatterns(router)
+    factory = RequestFactory(SERVER_NAME='localhost')
+    violations = []
+    for title, url, params, headers in cases:
+        view, _, kwargs = next(filter(None, (
+            pattern.resolve(url[len('/api/'):]) for pattern in patterns
+        )))
+        paths = (('sync', view.sync_view), ('async', async_to_sync(view)))
+        timings = {}
+        answers = {}
+        for label, call in paths:
+            start = time.perf_counter()
+            for _ in range(samples):
+                response = call(factory.get(url, params, **headers), **kwargs)
+                answers[label] = response_json(response)
+            timings[label] = (time.perf_counter() - start) / samples
+        if answers['sync'] != answers['async']:
+            violations.append(f'{title}: ответ отличается от ViewSet')
+        stdout.write(
+            f'{title}: sync {timings["sync"] * 1000:.2f}ms, '
+            f'async {timings["async"] * 1000:.2f}ms'
+        )
+    return violations
+
+
+@contextmanager
+def previous_ingredient_indexes():
+    """Индекс IngredientsList по recipe_id, как до ingredientslist_recipe.
+
+    Изменение делается в транзакции и откатывается; на время замера
+    таблица заблокирована для записи.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX ingredientslist_recipe')
+            cursor.execute(
+                'CREATE INDEX ingredientslist_recipe_previous '
+                'ON recipes_ingredientslist (recipe_id)'
+            )
+        yield
+        transaction.set_rollback(True)
+
+
+def ordering_queries(recipe_ids, user, before):
+    """Запросы, которых касался порядок по умолчанию IngredientsList и User.
+
+    before=True — с прежним порядком: Meta.ordering по recipe__name и
+    username. В GROUP BY Django 3.2 его уже не добавлял, поэтому
+    агрегаты отличаются только индексом.
+    """
+    ingredients_order = 'recipe__name' if before else 'pk'
+    users_order = ('username',) if before else ()
+    ingredients = IngredientsList.objects.select_related('ingredients')
+    return {
+        'ингредиенты рецепта': ingredients.filter(
+            recipe__in=recipe_ids[:1]
+        ).order_by(ingredients_order),
+        'ингредиенты страницы': ingredients.filter(
+            recipe__in=recipe_ids
+        ).order_by(ingredients_order),
+        'суммы рецепта для корзины': IngredientsList.objects.filter(
+            recipe=recipe_ids[0]
+        ).values('ingredients').annotate(
+            total=Sum('amount')
+        ).values_list('ingredients', 'total').order_by(),
+        'итоги корзины': ShoppingCartTotal.objects.live_totals([user.pk]),
+        'авторы страницы': User.objects.filter(
+            recipes__in=recipe_ids
+        ).annotate(is_subscribed=Exists(Subscribe.objects.filter(
+            user=user, author=OuterRef('pk')
+        ))).order_by(*users_order),
+    }
+
+
+@scenario('ordering_plans')
+def ordering_plans(stdout, samples, **options):
+    """Планы и время запросов с прежним и явным порядком и индексами."""
+    user = benchmark_user()
+    recipe_ids = list(Recipes.objects.values_list(
+        'pk', flat=True
+    )[:DEFAULT_PAGE_SIZE])
+    if user is None or not recipe_ids:
+        stdout.write('Нет данных: запустите benchmark с --seed.')
+        return []
+    results = {}
+    for before in (True, False):
+        with previous_ingredient_indexes() if before else nullcontext():
+            queries = ordering_queries(recipe_ids, user, before)
+            for title, queryset in queries.items():
+                start = time.perf_counter()
+                for _ in range(samples):
+                    list(queryset.all())
+                elapsed = (time.perf_counter() - start) / samples
+                results.setdefault(title, []).append(
+                    (elapsed, queryset.explain())
+                )
+    for title, ((before, old_plan), (after, new_plan)) in results.items():
+        stdout.write(f'{title}: было {before * 1000:.2f}ms, '
+                     f'стало {after * 1000:.2f}ms')
+        for label, plan in (('было', old_plan), ('стало', new_plan)):
+            stdout.write(f'  {label}:')
+            for line in plan.splitlines():
+                stdout.write(f'    {line}')
+    return []
@@ -0,0 +1,342 @@
+import time
+from hashlib import md5
+from threading import Lock
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .compression import choose_encoding, compress, set_encoded_content
+from .renderers import render_json
+
+
+class Generation:
+    """Версия данных, общая для всех процессов через кэш Django.
+
+    Значение — время последнего изменения, поэтому из него же получаются
+    ETag и Last-Modified.
+    """
+
+    def __init__(self, name):
+        self.key = f'generation:{name}'
+
+    def get(self):
+        value = cache.get(self.key)
+        if value is None:
+            cache.add(self.key, time.time(), None)
+            value = cache.get(self.key)
+        return value
+
+    def bump(self):
+        cache.set(self.key, time.time(), None)
+
+
+class VersionedValue:
+    """Значение в памяти процесса, пересобираемое при смене версии."""
+
+    def __init__(self, generation, build):
+        self.generation = generation
+        self.build = build
+        self.lock = Lock()
+        self.version = None
+        self.value = None
+
+    def get(self):
+        version = self.generation.get()
+        with self.lock:
+            if self.version != version:
+                self.value = self.build()
+                self.version = version
+            return self.version, self.value
+
+
+class RenderedCache(VersionedValue):
+    """JSON-ответ, заранее отрендеренный и хранящийся в памяти процесса.
+
+    Сжатые варианты тела готовятся один раз на версию, а не на каждый
+    запрос.
+    """
+
+    def __init__(self, name, generation, build):
+        super().__init__(generation, lambda: render_json(build()))
+        self.name = name
+        self.encoded = {}
+
+    def encode(self, version, content, encoding):
+        with self.lock:
+            if (version, encoding) not in self.encoded:
+                self.encoded = {
+                    key: value for key, value in self.encoded.items()
+                    if key[0] == version
+                }
+                self.encoded[version, encoding] = compress(content, encoding)
+            return self.encoded[version, encoding]
+
+    def response(self, request):
+        version, content = self.get()
+        etag = f'"{self.name}-{int(version * 1000)}"'
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(version)
+        )
+        if response is None:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(version)
+        encoding = choose_encoding(request)
+        if (response.status_code == 200 and encoding
+                and len(content) >= settings.COMPRESSION_MIN_SIZE):
+            set_encoded_content(
+                response, self.encode(version, content, encoding), encoding
+            )
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+class ChangeJournal:
+    """Журнал изменённых объектов в кэше Django, общий для процессов.
+
+    Каждая запись получает номер из счётчика. Читатель запоминает номер,
+    до которого дочитал, и получает только новые id. Если часть записей
+    уже вытеснена из кэша или журнал сброшен, since() возвращает None:
+    нужно перестроить данные целиком.
+    """
+
+    timeout = 24 * 60 * 60
+    max_replay = 10000
+
+    def __init__(self, name):
+        self.key = f'journal:{name}'
+
+    def current(self):
+        cache.add(self.key, 0, None)
+        return cache.get(self.key)
+
+    def next(self):
+        self.current()
+        return cache.incr(self.key)
+
+    def record(self, *ids):
+        for pk in ids:
+            cache.set(f'{self.key}:{self.next()}', pk, self.timeout)
+
+    def reset(self):
+        # Номер без записи: у всех читателей since() вернёт None.
+        self.next()
+
+    def since(self, position):
+        current = self.current()
+        if position == current:
+            return current, []
+        if (position is None or position > current
+                or current - position > self.max_replay):
+            return current, None
+        keys = [f'{self.key}:{number}'
+                for number in range(position + 1, current + 1)]
+        entries = cache.get_many(keys)
+        if len(entries) != len(keys):
+            return current, None
+        return current, [entries[key] for key in keys]
+
+
+class ResponseCache:
+    """JSON-ответы для анонимных запросов в кэше Django, общие для процессов.
+
+    Аноним получает одинаковый ответ независимо от того, кто спрашивает,
+    поэтому ключ — адрес с нормализованной строкой запроса и версии
+    справочников, которые входят в ответ. Страницы списка сбрасываются
+    сменой list_generation, детальная страница — удалением своего ключа,
+    см. invalidate(). Срок хранения нужен только для вытеснения старых
+    версий списка.
+
+    Страницы с параметрами uncached_params не кэшируются: их порядок
+    зависит от данных, которые меняются чаще списка (избранное для
+    ordering=popular).
+    """
+
+    timeout = 24 * 60 * 60
+
+    def __init__(self, name, list_generation, *generations,
+                 uncached_params=()):
+        self.key = f'response:{name}'
+        self.list_generation = list_generation
+        self.generations = generations
+        self.uncached_params = uncached_params
+
+    def versions(self, *generations):
+        values = cache.get_many([generation.key for generation in generations])
+        return ':'.join(
+            repr(values.get(generation.key) or generation.get())
+            for generation in generations
+        )
+
+    @staticmethod
+    def variant(request):
+        params = sorted(
+            (name, sorted(values))
+            for name, values in request.query_params.lists()
+        )
+        address = (f'{request.scheme}://{request.get_host()}'
+                   f'{request.path}?{urlencode(params, doseq=True)}')
+        return md5(address.encode()).hexdigest()
+
+    @staticmethod
+    def cacheable(request):
+        return (request.user.is_anonymous
+                and request.accepted_renderer.format == 'json')
+
+    def list_cacheable(self, request):
+        return self.cacheable(request) and not any(
+            name in request.query_params for name in self.uncached_params
+        )
+
+    def detail_key(self, pk):
+        return f'{self.key}:detail:{pk}'
+
+    def cached_list(self, request):
+        """(ключ, тело ответа или None) для страницы списка."""
+        key = (f'{self.key}:list:'
+               f'{self.versions(self.list_generation, *self.generations)}:'
+               f'{self.variant(request)}')
+        return key, cache.get(key)
+
+    def store_list(self, key, content):
+        cache.set(key, content, self.timeout)
+
+    def cached_detail(self, request, pk):
+        """(ключ, метка, тело ответа или None) для рецепта."""
+        # Одна запись на рецепт, чтобы её можно было удалить одним ключом;
+        # другой адрес или версия справочников просто перезаписывают её.
+        key = self.detail_key(pk)
+        tag = f'{self.versions(*self.generations)}:{self.variant(request)}'
+        entry = cache.get(key)
+        if entry is not None and entry[0] == tag:
+            return key, tag, entry[1]
+        return key, tag, None
+
+    def store_detail(self, key, tag, content):
+        cache.set(key, (tag, content), self.timeout)
+
+    def list(self, request, get_response):
+        if not self.list_cacheable(request):
+            return get_response()
+        key, content = self.cached_list(request)
+        if content is not None:
+            return self.response(content, 'HIT')
+        response = get_response()
+        if response.status_code != 200:
+            return response
+        content = render_json(response.data)
+        self.store_list(key, content)
+        return self.response(content, 'MISS')
+
+    def detail(self, request, pk, get_response):
+        if not self.cacheable(request) or not str(pk).isdigit():
+            return get_response()
+        key, tag, content = self.cached_detail(request, int(pk))
+        if content is not None:
+            return self.response(content, 'HIT')
+        response = get_response()
+        if response.status_code != 200:
+            return response
+        content = render_json(response.data)
+        self.store_detail(key, tag, content)
+        return self.response(content, 'MISS')
+
+    def representation_key(self, pk):
+        return f'{self.key}:representation:{pk}'
+
+    def representations(self, request, ids, build):
+        """Представления рецептов без личных полей, общие для всех.
+
+        Версии справочников и сами представления читаются одним запросом
+        к кэшу; недостающие строит build(ids) -> {id: данные}.
+        """
+        keys = {pk: self.representation_key(pk) for pk in ids}
+        entries = cache.get_many(
+            [generation.key for generation in self.generations]
+            + list(keys.values())
+        )
+        versions = ':'.join(
+            repr(entries.get(generation.key) or generation.get())
+            for generation in self.generations
+        )
+        # Ссылки на изображения абсолютные, поэтому адрес сервера — часть
+        # версии.
+        tag = f'{versions}:{request.scheme}://{request.get_host()}'
+        found = {}
+        for pk, key in keys.items():
+            entry = entries.get(key)
+            if entry is not None and entry[0] == tag:
+                found[pk] = entry[1]
+        missing = [pk for pk in ids if pk not in found]
+        if missing:
+            built = build(missing)
+            cache.set_many(
+                {keys[pk]: (tag, data) for pk, data in built.items()},
+                self.timeout
+            )
+            found.update(built)
+        return found
+
+    def invalidate(self, *ids):
+        cache.delete_many(
+            [self.detail_key(pk) for pk in ids]
+            + [self.representation_key(pk) for pk in ids]
+        )
+        self.list_generation.bump()
+
+    @staticmethod
+    def response(content, status):
+        response = HttpResponse(content, content_type='application/json')
+        response['X-Cache'] = status
+        return response
+
+
+class UserSets:
+    """Наборы id, принадлежащие пользователю, в кэше Django.
+
+    Запись в кэше помечена версией пользователя. Изменение меняет версию
+    после фиксации транзакции, поэтому набор, прочитанный из базы до
+    фиксации и сохранённый позже, уже не совпадёт с версией и будет
+    перечитан. load(user_id) возвращает словарь наборов.
+    """
+
+    timeout = 24 * 60 * 60
+
+    def __init__(self, name, load):
+        self.name = name
+        self.load = load
+
+    def generation(self, user_id):
+        return Generation(f'{self.name}:{user_id}')
+
+    def get(self, user_id):
+        generation = self.generation(user_id)
+        key = f'{self.name}:{user_id}'
+        entries = cache.get_many([generation.key, key])
+        version = entries.get(generation.key) or generation.get()
+        entry = entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        value = self.load(user_id)
+        cache.set(key, (version, value), self.timeout)
+        return value
+
+    def invalidate(self, user_id):
+        self.generation(user_id).bump()
+
+
+tags_generation = Generation('tags')
+ingredients_generation = Generation('ingredients')
+users_generation = Generation('users')
+recipes_list_generation = Generation('recipes_list')
+recipes_search_generation = Generation('recipes_search')
+recipes_journal = ChangeJournal('recipes')
+recipe_responses = ResponseCache(
+    'recipes', recipes_list_generation,
+    tags_generation, ingredients_generation, users_generation,
+    uncached_params=('ordering',)
+)
@@ -0,0 +1,100 @@
+import asyncio
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+
+def accepted_encodings(request):
+    """Кодировки из Accept-Encoding, кроме отклонённых через q=0."""
+    encodings = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        encoding, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if quality > 0:
+            encodings.add(encoding.strip().lower())
+    return encodings
+
+
+def choose_encoding(request):
+    """br, если клиент его принимает и установлен brotli, иначе gzip."""
+    encodings = accepted_encodings(request)
+    if brotli is not None and 'br' in encodings:
+        return 'br'
+    if 'gzip' in encodings:
+        return 'gzip'
+    return None
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=settings.BROTLI_QUALITY)
+    # mtime=0: одинаковое содержимое даёт одинаковые байты.
+    return gzip.compress(content, settings.GZIP_LEVEL, mtime=0)
+
+
+def set_encoded_content(response, content, encoding):
+    response.content = content
+    response['Content-Length'] = str(len(content))
+    response['Content-Encoding'] = encoding
+    # Тело уже не совпадает побайтно с исходным, как в GZipMiddleware.
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = f'W/{etag}'
+
+
+class CompressionMiddleware:
+    """Сжимает крупные ответы JSON и текста: brotli или gzip.
+
+    Потоковые ответы (списки покупок) и уже сжатые (заранее сжатые
+    RenderedCache) пропускаются.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Как MiddlewareMixin._async_check в Django 3.2.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(
+            request, await self.get_response(request)
+        )
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '')
+        if (response.streaming or response.has_header('Content-Encoding')
+                or not content_type.startswith(COMPRESSIBLE_TYPES)):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        encoding = choose_encoding(request)
+        if encoding is None:
+            return response
+        content = compress(response.content, encoding)
+        if len(content) < len(response.content):
+            set_encoded_content(response, content, encoding)
+        return response
@@ -1 +1,7 @@
 MIN_VALUE_FOR_COOKING = 1
+INGREDIENT_SEARCH_LIMIT = 50
+DEFAULT_PAGE_SIZE = 6
+BASE64_CHUNK_SIZE = 64 * 1024
+SEARCH_CONFIG = 'russian'
+RECIPE_SEARCH_LIMIT = 1000
+BULK_RECIPES_LIMIT = 100
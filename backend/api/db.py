@@ -0,0 +1,18 @@
+from django.core.signals import request_started
+from django.db import connections
+from django.dispatch import receiver
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    """Закрывает постоянные соединения, оборвавшиеся между запросами.
+
+    Замена CONN_HEALTH_CHECKS из Django 4.1: после перезапуска базы или
+    PgBouncer первый запрос воркера откроет новое соединение, а не
+    завершится ошибкой.
+    """
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not connection.is_usable()):
+            connection.close()
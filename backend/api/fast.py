@@ -0,0 +1,143 @@
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+
+from recipes.images import RENDITIONS
+from recipes.models import IngredientsList, Recipes, Tag, TagRecipe
+
+from .cache import VersionedValue, tags_generation
+
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit')
+USER_FIELDS = ('email', 'id', 'username', 'first_name', 'last_name')
+
+# Ответы GET строятся из .values() без полей DRF. Словари совпадают со
+# схемой docs/openapi-schema.yml и с выводом сериализаторов из
+# serializers.py, что проверяет tests/test_fast.py.
+
+tag_rows = VersionedValue(
+    tags_generation,
+    lambda: {tag['id']: tag for tag in Tag.objects.values(*TAG_FIELDS)}
+)
+
+
+def file_url(request, name):
+    """Как ImageField.to_representation: абсолютная ссылка при request."""
+    if not name:
+        return None
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def tag_dicts(queryset=None):
+    if queryset is None:
+        _, tags = tag_rows.get()
+        return list(tags.values())
+    return list(queryset.values(*TAG_FIELDS))
+
+
+def ingredient_dicts(queryset):
+    return list(queryset.values(*INGREDIENT_FIELDS))
+
+
+def catalog_tags(ids):
+    """Теги по id из tag_rows; недостающие читаются из базы.
+
+    Каталог может отставать от связей рецептов: тег, добавленный после
+    его сборки, не должен ронять ответ.
+    """
+    _, tags = tag_rows.get()
+    missing = ids - tags.keys()
+    if not missing:
+        return tags
+    return {**tags, **{
+        tag['id']: tag
+        for tag in Tag.objects.filter(pk__in=missing).values(*TAG_FIELDS)
+    }}
+
+
+def recipe_dicts(request, ids):
+    """Рецепты по id без личных полей: {id: словарь RecipeSerializer}.
+
+    Три запроса на любую страницу: рецепты с авторами, связи с тегами
+    (сами теги берутся из tag_rows, см. catalog_tags) и ингредиенты.
+    Порядок тегов и ингредиентов сериализатор не задаёт, здесь он —
+    порядок добавления.
+    """
+    rows = Recipes.objects.filter(pk__in=ids).order_by().values(
+        'id', 'name', 'image', 'image_renditions', 'text', 'cooking_time',
+        *(f'author__{field}' for field in USER_FIELDS)
+    )
+    links = list(TagRecipe.objects.filter(recipe_id__in=ids).order_by(
+        'pk'
+    ).values_list('recipe_id', 'tag_id'))
+    tags = catalog_tags({tag_id for _, tag_id in links})
+    recipe_tags = defaultdict(list)
+    for recipe_id, tag_id in links:
+        if tag_id in tags:
+            recipe_tags[recipe_id].append(tags[tag_id])
+    ingredients = defaultdict(list)
+    for recipe_id, *ingredient in IngredientsList.objects.filter(
+        recipe_id__in=ids
+    ).order_by('pk').values_list(
+        'recipe_id', 'ingredients_id', 'ingredients__name',
+        'ingredients__measurement_unit', 'amount'
+    ):
+        ingredients[recipe_id].append(
+            dict(zip(('id', 'name', 'measurement_unit', 'amount'),
+                     ingredient))
+        )
+    result = {}
+    for row in rows:
+        author = {field: row[f'author__{field}'] for field in USER_FIELDS}
+        author['is_subscribed'] = False
+        result[row['id']] = {
+            'id': row['id'],
+            'tags': [dict(tag) for tag in recipe_tags[row['id']]],
+            'author': author,
+            'ingredients': ingredients[row['id']],
+            'is_favorited': False,
+            'is_in_shopping_cart': False,
+            'name': row['name'],
+            'image': file_url(request, row['image']),
+            'images': image_urls(request, row['image'],
+                                 row['image_renditions']),
+            'text': row['text'],
+            'cooking_time': row['cooking_time'],
+        }
+    return result
+
+
+def image_urls(request, image, renditions):
+    """Как RecipeSerializer.get_images."""
+    if not image:
+        return {}
+    renditions = renditions or {}
+    return {
+        rendition: file_url(request, renditions.get(rendition, image))
+        for rendition in RENDITIONS
+    }
+
+
+def subscription_dicts(users, recipes):
+    """Ответ SubscribeSerializer для страницы авторов.
+
+    recipes — выборка рецептов этих авторов, уже ограниченная
+    recipes_limit.
+    """
+    previews = defaultdict(list)
+    for row in recipes.values('id', 'name', 'image', 'cooking_time',
+                              'author_id'):
+        author_id = row.pop('author_id')
+        # RecipeInfoSerializer получает контекст без request.
+        row['image'] = file_url(None, row['image'])
+        previews[author_id].append(row)
+    return [
+        dict(
+            {field: getattr(user, field) for field in USER_FIELDS},
+            is_subscribed=True,
+            recipes=previews[user.pk],
+            recipes_count=user.recipes_count,
+        )
+        for user in users
+    ]
@@ -1,32 +1,120 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import BooleanField, Case, Exists, F, OuterRef, When
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipes
+from recipes.models import Ingredient, Recipes, Tag, TagRecipe
+
+from .cache import VersionedValue, tags_generation
+from .constants import (INGREDIENT_SEARCH_LIMIT, RECIPE_SEARCH_LIMIT,
+                        SEARCH_CONFIG)
+from .search import ingredient_index, recipe_index
+
+tag_ids = VersionedValue(
+    tags_generation, lambda: dict(Tag.objects.values_list('slug', 'id'))
+)
+
+
+def tag_choices():
+    _, slugs = tag_ids.get()
+    return [(slug, slug) for slug in slugs]
+
+
+class TagsFilter(filters.MultipleChoiceFilter):
+    """Фильтр по слагам тегов без DISTINCT и без дублей рецептов.
+
+    Слаги переводятся в id по закэшированному списку тегов, а совпадение
+    проверяется подзапросом EXISTS по таблице связей.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('choices', tag_choices)
+        super().__init__(*args, **kwargs)
+
+    def filter(self, queryset, value):
+        if not value:
+            return queryset
+        # Каталог мог смениться после проверки choices: удалённого тега
+        # в нём уже нет.
+        _, slugs = tag_ids.get()
+        return queryset.filter(Exists(
+            TagRecipe.objects.filter(
+                recipe=OuterRef('pk'),
+                tag__in=[slugs[slug] for slug in value if slug in slugs]
+            )
+        ))
+
+
+def order_by_ids(queryset, ids):
+    return queryset.filter(pk__in=ids).order_by(Case(
+        *(When(pk=pk, then=position) for position, pk in enumerate(ids)),
+        default=len(ids)
+    ))
 
 
 class IngredientFilter(FilterSet):
-    name = filters.CharFilter(lookup_expr="icontains")
+    name = filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
 
+    def filter_name(self, queryset, name, value):
+        if connection.vendor != 'postgresql':
+            return order_by_ids(
+                queryset,
+                ingredient_index.search(value, INGREDIENT_SEARCH_LIMIT)
+            )
+        return queryset.filter(name__icontains=value).annotate(
+            is_prefix=Case(
+                When(name__istartswith=value, then=True),
+                default=False,
+                output_field=BooleanField()
+            )
+        ).order_by('-is_prefix', 'name')[:INGREDIENT_SEARCH_LIMIT]
+
 
 class RecipeFilter(FilterSet):
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = TagsFilter()
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'Популярные'),),
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipes
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'ordering')
+
+    def filter_ordering(self, queryset, name, value):
+        # Порядок совпадает с индексом recipes_popular.
+        return queryset.order_by('-favorites_count', '-pub_date')
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию, ингредиентам и описанию.
+
+        Результаты упорядочены по релевантности; в режиме курсора
+        пагинация сортирует их по дате, как и весь список.
+        """
+        if connection.vendor != 'postgresql':
+            return order_by_ids(
+                queryset, recipe_index.search(value, RECIPE_SEARCH_LIMIT)
+            )
+        query = SearchQuery(value, config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-pub_date', '-id')
 
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(shopping_cart__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
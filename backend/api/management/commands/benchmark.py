@@ -0,0 +1,39 @@
+from django.core.management import BaseCommand, CommandError
+
+from api.benchmarks import SCENARIOS
+from api.seed import seed
+
+
+class Command(BaseCommand):
+    help = 'Замеряет время ответа API на текущей базе данных.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios', nargs='*',
+            help=f'Сценарии: {", ".join(sorted(SCENARIOS))}. По умолчанию все.'
+        )
+        parser.add_argument(
+            '--samples', type=int, default=100,
+            help='Сколько объектов брать для замеров.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0, metavar='USERS',
+            help='Сначала создать столько пользователей с рецептами, '
+                 'подписками, избранным и корзинами.'
+        )
+
+    def handle(self, *args, **options):
+        scenarios = options.pop('scenarios') or sorted(SCENARIOS)
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Неизвестные сценарии: {", ".join(unknown)}')
+        if options['seed']:
+            seed(users=options['seed'])
+        violations = []
+        for name in scenarios:
+            self.stdout.write(f'== {name}')
+            violations += SCENARIOS[name](self.stdout, **options) or []
+        if violations:
+            raise CommandError(
+                'Проверки не пройдены:\n' + '\n'.join(violations)
+            )
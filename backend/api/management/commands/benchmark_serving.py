@@ -0,0 +1,106 @@
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from api.benchmarks import percentile
+
+from .loadtest import make_plan, run_plan
+
+MODES = ('sync', 'gthread', 'asgi')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError('gunicorn завершился при запуске')
+        try:
+            urllib.request.urlopen(f'{url}/api/tags/', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f'Сервер {url} не ответил за {timeout} с')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает режимы gunicorn.conf.py (sync, gthread, asgi): '
+            'запускает сервер в каждом режиме и гоняет план loadtest.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=MODES,
+                            default=list(MODES))
+        parser.add_argument('--server-workers', type=int,
+                            help='GUNICORN_WORKERS, по умолчанию от CPU.')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--clients', type=int, default=16,
+                            help='Одновременных клиентов.')
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--random-seed', type=int, default=0)
+        parser.add_argument(
+            '--collection', type=Path,
+            default=(settings.BASE_DIR.parent / 'postman-collection'
+                     / 'diploma.postman_collection.json')
+        )
+
+    def handle(self, *args, **options):
+        if not options['collection'].exists():
+            raise CommandError(f'Нет файла {options["collection"]}')
+        # Один и тот же план для всех режимов.
+        plan = make_plan(
+            random.Random(options['random_seed']), options['collection'],
+            options['requests'], options['users']
+        )
+        self.stdout.write(
+            f'{"режим":<8} {"запросов/с":>11} {"p50":>8} {"p99":>8} '
+            f'{"5xx":>5}'
+        )
+        for mode in options['modes']:
+            self.stdout.write(self.run_mode(mode, plan, options))
+
+    def run_mode(self, mode, plan, options):
+        port = free_port()
+        url = f'http://127.0.0.1:{port}'
+        env = dict(os.environ, GUNICORN_MODE=mode,
+                   GUNICORN_BIND=f'127.0.0.1:{port}',
+                   DJANGO_SETTINGS_MODULE=os.environ.get(
+                       'DJANGO_SETTINGS_MODULE', 'foodgram.settings'
+                   ))
+        if options['server_workers']:
+            env['GUNICORN_WORKERS'] = str(options['server_workers'])
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config',
+             str(settings.BASE_DIR / 'gunicorn.conf.py')],
+            cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_ready(url, process)
+            # Прогрев: воркеры строят индексы и кэши в памяти.
+            run_plan(plan[:options['clients'] * 4], options['clients'],
+                     'thread', url)
+            results, elapsed = run_plan(plan, options['clients'], 'thread',
+                                        url)
+        finally:
+            process.terminate()
+            process.wait()
+        timings = [timing * 1000 for label, status, timing in results]
+        errors = sum(1 for label, status, timing in results if status >= 500)
+        return (
+            f'{mode:<8} {len(results) / elapsed:>11.1f} '
+            f'{percentile(timings, 50):>8.2f} '
+            f'{percentile(timings, 99):>8.2f} {errors:>5}'
+        )
@@ -0,0 +1,158 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from api.constants import SEARCH_CONFIG
+from api.fast import USER_FIELDS
+from api.pagination import RecipePagination
+from recipes.models import (Favorite, Ingredient, IngredientsList, Recipes,
+                            ShoppingCart, ShoppingCartTotal, TagRecipe)
+from users.models import Subscribe, User
+
+# Значения параметров не важны: план строится без данных.
+USER = 1
+RECIPE = 1
+IDS = [1, 2, 3]
+
+
+def hot_queries():
+    """Запросы горячих путей API в том виде, в каком их строят
+    api/views.py, api/serializers.py, api/filters.py и api/overlay.py.
+
+    Значение — (выборка, базы, на которых запрос выполняется).
+    """
+    all_vendors = ('postgresql', 'sqlite')
+    pagination = RecipePagination()
+    page = Recipes.objects.only('pk', 'pub_date')
+    queries = {
+        'список рецептов': page[:6],
+        'курсор рецептов': page.filter(
+            pagination.get_after_position([timezone.now(), RECIPE])
+        ).order_by(*pagination.keyset)[:7],
+        'рецепты автора': page.filter(author=USER)[:6],
+        'популярные рецепты': page.order_by(
+            '-favorites_count', '-pub_date'
+        )[:6],
+        'рецепты по тегам': page.filter(Exists(
+            TagRecipe.objects.filter(recipe=OuterRef('pk'), tag__in=IDS)
+        ))[:6],
+        'избранные рецепты': page.filter(Exists(Favorite.objects.filter(
+            user=USER, recipe=OuterRef('pk')
+        )))[:6],
+        'рецепты в корзине': page.filter(Exists(ShoppingCart.objects.filter(
+            user=USER, recipe=OuterRef('pk')
+        )))[:6],
+        'в избранном': Favorite.objects.filter(user=USER, recipe=RECIPE)[:1],
+        'в корзине': ShoppingCart.objects.filter(
+            user=USER, recipe=RECIPE
+        )[:1],
+        'подписан': Subscribe.objects.filter(user=USER, author=USER)[:1],
+        'отметки: избранное': Favorite.objects.filter(
+            user=USER
+        ).values_list('recipe_id'),
+        'отметки: корзина': ShoppingCart.objects.filter(
+            user=USER
+        ).values_list('recipe_id'),
+        'отметки: подписки': Subscribe.objects.filter(
+            user=USER
+        ).values_list('author_id'),
+        'подписки': User.objects.filter(authors__user=USER).only(
+            *USER_FIELDS, 'recipes_count'
+        ).order_by('username')[:6],
+        'рецепты подписок': Recipes.objects.filter(
+            author__in=IDS,
+            pk__in=Subquery(Recipes.objects.filter(
+                author=OuterRef('author')
+            ).values('pk')[:3])
+        ).values('id', 'name', 'image', 'cooking_time', 'author_id'),
+        'число рецептов по тегам': TagRecipe.objects.filter(
+            recipe__in=page.filter(author=USER).values('pk')
+        ).values('tag').annotate(count=Count('recipe')).order_by(),
+        'теги рецептов': TagRecipe.objects.filter(
+            recipe_id__in=IDS
+        ).order_by('pk').values_list('recipe_id', 'tag_id'),
+        'ингредиенты рецептов': IngredientsList.objects.filter(
+            recipe_id__in=IDS
+        ).order_by('pk').values_list('recipe_id', 'ingredients_id', 'amount'),
+        'корзины с рецептом': ShoppingCart.objects.filter(
+            recipe=RECIPE
+        ).values_list('user_id'),
+        'список покупок': ShoppingCartTotal.objects.filter(
+            user=USER
+        ).order_by('ingredient__name').values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        ),
+        'ингредиенты по алфавиту': Ingredient.objects.order_by('name')[:50],
+        'токен': Token.objects.select_related('user').filter(key='0' * 40),
+    }
+    queries = {name: (query, all_vendors) for name, query in queries.items()}
+    # На других базах поиск идёт по индексам в памяти (api/search.py).
+    queries['поиск ингредиентов'] = (
+        Ingredient.objects.filter(name__icontains='ка')[:10],
+        ('postgresql',)
+    )
+    queries['поиск рецептов'] = (
+        page.filter(search_vector=SearchQuery('суп', config=SEARCH_CONFIG)),
+        ('postgresql',)
+    )
+    return queries
+
+
+def explain(queryset):
+    if connection.vendor != 'postgresql':
+        return queryset.explain()
+    # Без последовательного просмотра планировщик берёт любой подходящий
+    # индекс даже на маленькой таблице; Seq Scan в плане значит, что
+    # индекса нет.
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+
+def full_scans(plan):
+    """Таблицы, которые план читает целиком."""
+    if connection.vendor == 'postgresql':
+        return re.findall(r'Seq Scan on (\w+)', plan)
+    tables = set(connection.introspection.table_names())
+    return [
+        table for table
+        in re.findall(r'\bSCAN (?:TABLE )?(\w+)\b(?! USING)', plan)
+        if table in tables
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Проверяет планы (EXPLAIN) запросов горячих путей API: '
+            'ни одна таблица не должна читаться целиком.')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(
+                f'Планы {connection.vendor} не поддерживаются.'
+            )
+        violations = []
+        for name, (queryset, vendors) in hot_queries().items():
+            if connection.vendor not in vendors:
+                continue
+            plan = explain(queryset)
+            tables = full_scans(plan)
+            if tables:
+                violations.append(
+                    f'{name}: полный просмотр {", ".join(tables)}'
+                )
+            self.stdout.write(
+                f'{name:<26} '
+                f'{"полный просмотр " + ", ".join(tables) if tables else "ok"}'
+            )
+            if options['verbosity'] > 1:
+                self.stdout.write(plan)
+        if violations:
+            raise CommandError(
+                'Запросы без индекса:\n' + '\n'.join(violations)
+            )
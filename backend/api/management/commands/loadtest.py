@@ -0,0 +1,287 @@
+import http.client
+import json
+import multiprocessing
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from api.benchmarks import percentile
+from api.seed import seed
+from recipes.models import Ingredient, Recipes, Tag
+from users.models import User
+
+VARIABLE = re.compile(r'{{(\w+)}}')
+
+# Относительная частота запросов: список рецептов открывают чаще всего.
+ENDPOINT_WEIGHTS = {
+    '/api/recipes/': 10,
+    '/api/recipes/{{firstRecipeId}}/': 5,
+    '/api/ingredients/': 3,
+    '/api/users/subscriptions/': 2,
+    '/api/tags/': 2,
+}
+
+
+def load_collection(path):
+    """GET-запросы коллекции Postman: (название, адрес, нужен ли токен)."""
+    with open(path, encoding='UTF-8') as file:
+        collection = json.load(file)
+    requests = []
+
+    def walk(items, auth):
+        for item in items:
+            item_auth = item.get('auth') or auth
+            if 'item' in item:
+                walk(item['item'], item_auth)
+                continue
+            request = item['request']
+            request_auth = request.get('auth') or item_auth
+            if (request['method'] != 'GET'
+                    or 'non_existing' in item['name']):
+                continue
+            url = request['url']
+            url = url['raw'] if isinstance(url, dict) else url
+            requests.append((
+                item['name'],
+                url.replace('{{baseUrl}}', ''),
+                bool(request_auth) and request_auth['type'] != 'noauth'
+            ))
+
+    walk(collection['item'], collection.get('auth'))
+    return requests
+
+
+def endpoint_weight(url):
+    return ENDPOINT_WEIGHTS.get(url.partition('?')[0], 1)
+
+
+class VariablePool:
+    """Подставляет в адреса коллекции значения из текущей базы."""
+
+    def __init__(self, rng, size=1000):
+        self.rng = rng
+        users = list(User.objects.order_by('?').values_list(
+            'pk', flat=True
+        )[:size])
+        ingredients = list(Ingredient.objects.order_by('?').values_list(
+            'pk', 'name'
+        )[:size])
+        self.pools = (
+            ('userid', users),
+            ('tagid', list(Tag.objects.values_list('pk', flat=True))),
+            ('tagslug', list(Tag.objects.values_list('slug', flat=True))),
+            ('indredientid', [pk for pk, name in ingredients]),
+            ('ingredientid', [pk for pk, name in ingredients]),
+            ('latter', sorted({name[0] for pk, name in ingredients})),
+            ('recipeid', list(Recipes.objects.order_by('?').values_list(
+                'pk', flat=True
+            )[:size])),
+        )
+
+    def resolve(self, match):
+        name = match.group(1).lower()
+        for suffix, values in self.pools:
+            if name.endswith(suffix):
+                if not values:
+                    raise CommandError(
+                        f'Нет данных для {{{{{match.group(1)}}}}}: '
+                        'запустите loadtest с --seed-users.'
+                    )
+                return str(self.rng.choice(values))
+        raise CommandError(f'Неизвестная переменная {match.group(0)}')
+
+    def url(self, template):
+        return VARIABLE.sub(self.resolve, template)
+
+
+def run_chunk(chunk, base_url, host):
+    """Выполняет запросы по очереди, как один пользователь."""
+    results = []
+    if base_url:
+        parts = urlsplit(base_url)
+        connection_class = (http.client.HTTPSConnection
+                            if parts.scheme == 'https'
+                            else http.client.HTTPConnection)
+        connection = connection_class(parts.netloc, timeout=30)
+        prefix = parts.path.rstrip('/')
+    else:
+        client = Client(HTTP_HOST=host)
+    try:
+        for label, url, token in chunk:
+            start = time.perf_counter()
+            if base_url:
+                headers = {'Authorization': f'Token {token}'} if token else {}
+                # В адресе бывают буквы кириллицы (поиск ингредиентов).
+                connection.request('GET', quote(prefix + url, safe='/?&=%'),
+                                   headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            else:
+                extra = ({'HTTP_AUTHORIZATION': f'Token {token}'}
+                         if token else {})
+                response = client.get(url, **extra)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                status = response.status_code
+            results.append((label, status, time.perf_counter() - start))
+    finally:
+        if base_url:
+            connection.close()
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+    return results
+
+
+def make_plan(rng, collection, requests, users):
+    """Случайная взвешенная последовательность (метка, адрес, токен)."""
+    collection_requests = load_collection(collection)
+    if not collection_requests:
+        raise CommandError('В коллекции нет GET-запросов')
+    tokens = [Token.objects.get_or_create(user=user)[0].key
+              for user in User.objects.order_by('?')[:users]]
+    variables = VariablePool(rng)
+    weights = [endpoint_weight(url)
+               for name, url, auth in collection_requests]
+    plan = []
+    for name, url, auth in rng.choices(
+        collection_requests, weights, k=requests
+    ):
+        if auth and not tokens:
+            raise CommandError('Нет пользователей для запросов с токеном')
+        label = f'GET {url}' + (' [токен]' if auth else '')
+        token = rng.choice(tokens) if auth else None
+        plan.append((label, variables.url(url), token))
+    return plan
+
+
+def run_plan(plan, workers, pool, url=None, host='localhost'):
+    """Выполняет план в workers потоках или процессах.
+
+    Возвращает результаты (метка, статус, время) и общее время.
+    """
+    chunks = [plan[number::workers] for number in range(workers)]
+    if pool == 'process':
+        # Дочерние процессы не должны наследовать открытые соединения.
+        connections.close_all()
+        executor = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('fork')
+        )
+    else:
+        executor = ThreadPoolExecutor(workers)
+    start = time.perf_counter()
+    with executor:
+        futures = [executor.submit(run_chunk, chunk, url, host)
+                   for chunk in chunks]
+        results = [result for future in futures
+                   for result in future.result()]
+    return results, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон: GET-запросы из коллекции Postman '
+            'в случайной взвешенной последовательности.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--collection', type=Path,
+            default=(settings.BASE_DIR.parent / 'postman-collection'
+                     / 'diploma.postman_collection.json')
+        )
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера, например http://127.0.0.1:8000. '
+                 'Без него запросы идут через тестовый клиент Django.'
+        )
+        parser.add_argument('--host', default='localhost',
+                            help='Заголовок Host для тестового клиента.')
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--pool', choices=('thread', 'process'),
+                            default='thread')
+        parser.add_argument('--users', type=int, default=50,
+                            help='Сколько пользователей получат токены.')
+        parser.add_argument('--random-seed', type=int, default=0)
+        seeding = parser.add_argument_group('наполнение базы')
+        seeding.add_argument('--seed-users', type=int, default=0)
+        seeding.add_argument('--recipes', type=int, default=5,
+                             help='Рецептов на пользователя.')
+        seeding.add_argument('--ingredients', type=int, default=6,
+                             help='Ингредиентов в рецепте.')
+        seeding.add_argument('--subscriptions', type=int, default=10)
+        seeding.add_argument('--favorites', type=int, default=10)
+        seeding.add_argument('--carts', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['random_seed'])
+        if options['seed_users']:
+            start = time.perf_counter()
+            seed(
+                users=options['seed_users'],
+                recipes=options['recipes'],
+                ingredients=options['ingredients'],
+                subscriptions=options['subscriptions'],
+                favorites=options['favorites'],
+                carts=options['carts'],
+                random_seed=options['random_seed'],
+            )
+            self.stdout.write(
+                f'База наполнена за {time.perf_counter() - start:.1f} с'
+            )
+        if not options['collection'].exists():
+            raise CommandError(f'Нет файла {options["collection"]}')
+        plan = make_plan(
+            rng, options['collection'], options['requests'], options['users']
+        )
+        workers = max(1, options['workers'])
+        results, elapsed = run_plan(
+            plan, workers, options['pool'], options['url'], options['host']
+        )
+        self.report(results, elapsed, workers, options)
+
+    def report(self, results, elapsed, workers, options):
+        mode = options['url'] or 'тестовый клиент'
+        self.stdout.write(
+            f'{len(results)} запросов за {elapsed:.2f} с, '
+            f'{len(results) / elapsed:.1f} запросов/с '
+            f'({mode}, {workers} x {options["pool"]})'
+        )
+        by_label = defaultdict(list)
+        for label, status, timing in results:
+            by_label[label].append((status, timing * 1000))
+        width = max(len(label) for label in by_label)
+        self.stdout.write(
+            f'{"запрос":<{width}} {"n":>6} {"rps":>7} {"p50":>8} '
+            f'{"p95":>8} {"p99":>8} {"max":>8}  статусы'
+        )
+        for label, rows in sorted(
+            by_label.items(), key=lambda item: -len(item[1])
+        ):
+            timings = [timing for status, timing in rows]
+            statuses = defaultdict(int)
+            for status, timing in rows:
+                statuses[status] += 1
+            self.stdout.write(
+                f'{label:<{width}} {len(rows):>6} '
+                f'{len(rows) / elapsed:>7.1f} '
+                f'{percentile(timings, 50):>8.2f} '
+                f'{percentile(timings, 95):>8.2f} '
+                f'{percentile(timings, 99):>8.2f} '
+                f'{max(timings):>8.2f}  '
+                + ' '.join(f'{status}:{count}'
+                           for status, count in sorted(statuses.items()))
+            )
+        errors = sum(1 for label, status, timing in results if status >= 500)
+        if errors:
+            raise CommandError(f'Ответов с ошибкой сервера: {errors}')
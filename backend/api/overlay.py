@@ -0,0 +1,33 @@
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscribe
+
+from .cache import UserSets
+
+
+def load_user_flags(user_id):
+    return {
+        'favorites': frozenset(Favorite.objects.filter(
+            user=user_id
+        ).values_list('recipe_id', flat=True)),
+        'shopping_cart': frozenset(ShoppingCart.objects.filter(
+            user=user_id
+        ).values_list('recipe_id', flat=True)),
+        'subscriptions': frozenset(Subscribe.objects.filter(
+            user=user_id
+        ).values_list('author_id', flat=True)),
+    }
+
+
+user_flags = UserSets('user_flags', load_user_flags)
+
+
+def personalize(data, flags):
+    """Общее представление рецепта с полями текущего пользователя."""
+    data = dict(data)
+    data['is_favorited'] = data['id'] in flags['favorites']
+    data['is_in_shopping_cart'] = data['id'] in flags['shopping_cart']
+    data['author'] = dict(
+        data['author'],
+        is_subscribed=data['author']['id'] in flags['subscriptions']
+    )
+    return data
@@ -1,5 +1,143 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import BigIntegerField, Q
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .constants import DEFAULT_PAGE_SIZE
+
+
+class KeysetPagination(PageNumberPagination):
+    """Пагинация по номеру страницы или, с параметром cursor, по ключу.
+
+    В режиме курсора (?cursor= для первой страницы, дальше — ссылка next)
+    выборка продолжается с последней записи по полям keyset, без OFFSET и
+    без COUNT(*).
+    """
+    page_size = DEFAULT_PAGE_SIZE
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    keyset = ('-id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.keyset)
+        position = self.decode_cursor(
+            request.query_params[self.cursor_query_param], queryset.model
+        )
+        if position:
+            queryset = queryset.filter(self.get_after_position(position))
+        results = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            last = results[-1]
+            self.next_position = [
+                getattr(last, field.lstrip('-')) for field in self.keyset
+            ]
+        return results
+
+    def get_after_position(self, position):
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.keyset, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def decode_cursor(self, cursor, model):
+        """Позиция из курсора: значения полей keyset в типах модели."""
+        if not cursor:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound('Неверный курсор.')
+        if (not isinstance(position, list)
+                or len(position) != len(self.keyset)
+                or None in position):
+            raise NotFound('Неверный курсор.')
+        try:
+            return [
+                self.parse_value(model, field, value)
+                for field, value in zip(self.keyset, position)
+            ]
+        except (DjangoValidationError, TypeError, ValueError):
+            raise NotFound('Неверный курсор.')
+
+    @staticmethod
+    def parse_value(model, field, value):
+        """Значение из курсора, проверенное полем модели.
+
+        Курсор приходит от клиента: подделанное значение не должно дойти
+        до запроса к базе. Диапазон целых SQLite не проверяет, поэтому он
+        проверяется здесь.
+        """
+        value = model._meta.get_field(field.lstrip('-')).clean(value, None)
+        if isinstance(value, int) and abs(value) > BigIntegerField.MAX_BIGINT:
+            raise ValueError(value)
+        return value
+
+    def encode_cursor(self, position):
+        # isoformat() вместо DjangoJSONEncoder: тот отбрасывает микросекунды.
+        position = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in position
+        ]
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class RecipePagination(KeysetPagination):
+    keyset = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Курсор идёт только по дате: порядок ordering=popular он
+        # потерял бы без предупреждения.
+        if (self.cursor_query_param in request.query_params
+                and 'ordering' in request.query_params):
+            raise ValidationError({'ordering': [
+                'Сортировка недоступна с параметром cursor: используйте '
+                'постраничный вывод (page).'
+            ]})
+        return super().paginate_queryset(queryset, request, view)
+
+
+class UserPagination(KeysetPagination):
+    keyset = ('username', 'id')
 
 
-class RecipePagination(PageNumberPagination):
+class RankedPagination(PageNumberPagination):
+    """Постраничный вывод заранее ранжированного списка."""
+    page_size = DEFAULT_PAGE_SIZE
     page_size_query_param = 'limit'
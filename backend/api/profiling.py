@@ -0,0 +1,228 @@
+import asyncio
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+current_profile = ContextVar('current_profile', default=None)
+
+FINGERPRINT_RULES = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+def fingerprint(sql):
+    """SQL без значений: одинаковые запросы с разными id совпадают."""
+    for pattern, replacement in FINGERPRINT_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+class Profile:
+    """Счётчики одного запроса к API."""
+
+    def __init__(self):
+        self.view = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.fingerprints = Counter()
+        self.depth = 0
+        # Запросы одного профиля идут из нескольких потоков (run_sync).
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.db_time += elapsed
+                self.queries += 1
+                self.fingerprints[fingerprint(sql)] += 1
+
+    @contextmanager
+    def record(self):
+        """Учитывает запросы к БД, выполненные в блоке.
+
+        Профиль хранится в контекстной переменной: её копию получают
+        потоки sync_to_async, поэтому учитываются и запросы из пула
+        потоков асинхронных обработчиков.
+        """
+        token = current_profile.set(self)
+        try:
+            yield self
+        finally:
+            current_profile.reset(token)
+
+    @contextmanager
+    def serializer_section(self):
+        # Вложенные сериализаторы уже учтены во внешнем.
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            if not self.depth:
+                self.serializer_time += time.perf_counter() - start
+
+    @property
+    def duplicates(self):
+        return {
+            sql: count for sql, count in self.fingerprints.most_common()
+            if count > 1
+        }
+
+    def as_dict(self, limit=5):
+        return {
+            'view': self.view,
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'serializer_ms': round(self.serializer_time * 1000, 2),
+            'duplicates': dict(list(self.duplicates.items())[:limit]),
+        }
+
+
+def profile_query(execute, sql, params, many, context):
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_profiler(connection, **kwargs):
+    """Ставит profile_query на соединение любого потока.
+
+    Сигнал приходит и при переподключении того же соединения. Обёртка
+    ставится первой: execute_wrapper() снимает последнюю.
+    """
+    if profile_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, profile_query)
+
+
+@contextmanager
+def serializer_section():
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    with profile.serializer_section():
+        yield
+
+
+class ProfiledListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with serializer_section():
+            return super().data
+
+
+class ProfiledSerializerMixin:
+    """Учитывает время сериализации в профиле текущего запроса.
+
+    Для many=True в Meta указывается list_serializer_class =
+    ProfiledListSerializer.
+    """
+
+    @property
+    def data(self):
+        with serializer_section():
+            return super().data
+
+
+class QueryProfileMiddleware:
+    """Считает SQL-запросы, время БД и сериализации для каждого запроса.
+
+    При DEBUG итоги добавляются в заголовки X-*, иначе пишутся одной
+    строкой JSON в лог api.profiling. Запросы, выполненные при отдаче
+    потокового ответа, не учитываются.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Как MiddlewareMixin._async_check в Django 3.2.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.API_PROFILING:
+            return self.get_response(request)
+        profile = Profile()
+        start = time.perf_counter()
+        with profile.record():
+            response = self.get_response(request)
+        return self.report(
+            request, response, profile, time.perf_counter() - start
+        )
+
+    async def __acall__(self, request):
+        if not settings.API_PROFILING:
+            return await self.get_response(request)
+        profile = Profile()
+        start = time.perf_counter()
+        with profile.record():
+            response = await self.get_response(request)
+        return self.report(
+            request, response, profile, time.perf_counter() - start
+        )
+
+    def report(self, request, response, profile, elapsed):
+        if profile.view is None:
+            return response
+        if settings.DEBUG:
+            response['X-Profile-View'] = profile.view
+            response['X-Query-Count'] = profile.queries
+            response['X-Duplicate-Queries'] = sum(
+                count - 1 for count in profile.duplicates.values()
+            )
+            response['X-DB-Time'] = f'{profile.db_time * 1000:.2f}'
+            response['X-Serializer-Time'] = (
+                f'{profile.serializer_time * 1000:.2f}'
+            )
+        else:
+            logger.info(json.dumps(dict(
+                profile.as_dict(),
+                method=request.method,
+                path=request.path,
+                status=response.status_code,
+                total_ms=round(elapsed * 1000, 2),
+            ), ensure_ascii=False))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return None
+        # Асинхронные обработчики (api/async_views.py) помнят ViewSet.
+        view_func = getattr(view_func, 'sync_view', view_func)
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None or not view_class.__module__.startswith(
+            'api.'
+        ):
+            return None
+        actions = getattr(view_func, 'actions', None) or {}
+        action = actions.get(request.method.lower(), request.method.lower())
+        profile.view = f'{view_class.__name__}.{action}'
+        return None
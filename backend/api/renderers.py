@@ -0,0 +1,177 @@
+import csv
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SHOPPING_LIST_TITLE = 'Список покупок'
+CYRILLIC = ''.join(map(chr, range(ord('А'), ord('я') + 1))) + 'Ёё'
+PDF_CHUNK_SIZE = 64 * 1024
+
+
+def use_orjson():
+    return orjson is not None and settings.API_JSON_BACKEND == 'orjson'
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Компактный JSON в UTF-8; с orjson — без стандартного json.
+
+    Типы, которых orjson не знает (Decimal, ленивые строки перевода),
+    преобразуются тем же JSONEncoder, что и в DRF. Отступы для
+    браузерной версии API и запрос без orjson обслуживает JSONRenderer.
+    """
+    default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not use_orjson() or self.get_indent(
+            accepted_media_type or '', renderer_context or {}
+        ):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        return orjson.dumps(
+            data, default=self.default, option=orjson.OPT_NON_STR_KEYS
+        )
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if not use_orjson():
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as error:
+            raise ParseError(f'JSON parse error - {error}')
+
+
+def render_json(data):
+    """JSON для ответов, отрендеренных заранее и хранящихся в кэше."""
+    return FastJSONRenderer().render(data)
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Строки списка: кортежи (название, единица измерения, количество).
+
+    stream() отдаёт содержимое по частям для StreamingHttpResponse,
+    render() нужен DRF только для ответов с ошибками.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = '\n'.join(str(value) for value in data.values())
+        return str(data or '').encode('utf-8')
+
+    def stream(self, rows):
+        raise NotImplementedError('.stream() must be implemented')
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        yield f'{SHOPPING_LIST_TITLE}:\n  '
+        for name, measurement_unit, amount in rows:
+            yield f'\n{name.title()}:  {amount}({measurement_unit}) '
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield '\ufeff' + writer.writerow(
+            ('Ингредиент', 'Единица измерения', 'Количество')
+        )
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_size = 12
+    line_height = 18
+    margin = 50
+
+    def get_font(self):
+        """Шрифт SHOPPING_LIST_PDF_FONT, в котором есть кириллица.
+
+        Встроенные шрифты PDF кириллицы не содержат, названия
+        ингредиентов вышли бы квадратами.
+        """
+        path = settings.SHOPPING_LIST_PDF_FONT
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name in pdfmetrics.getRegisteredFontNames():
+            return name
+        if not os.path.exists(path):
+            raise ImproperlyConfigured(
+                f'SHOPPING_LIST_PDF_FONT: файл шрифта {path} не найден.'
+            )
+        font = TTFont(name, path)
+        if not all(ord(char) in font.face.charToGlyph for char in CYRILLIC):
+            raise ImproperlyConfigured(
+                f'SHOPPING_LIST_PDF_FONT: в шрифте {path} нет кириллицы.'
+            )
+        pdfmetrics.registerFont(font)
+        return name
+
+    def stream(self, rows):
+        # Шрифт проверяется до начала ответа, а не посреди потока.
+        return self.pages(rows, self.get_font())
+
+    def pages(self, rows, font):
+        # PDF хранит таблицу ссылок в конце файла, поэтому документ
+        # собирается во временный файл и уже из него отдаётся частями.
+        with SpooledTemporaryFile(max_size=PDF_CHUNK_SIZE * 16) as file:
+            width, height = A4
+            pdf = canvas.Canvas(file, pagesize=A4)
+            pdf.setTitle(SHOPPING_LIST_TITLE)
+            pdf.setFont(font, self.font_size + 4)
+            y = height - self.margin
+            pdf.drawString(self.margin, y, f'{SHOPPING_LIST_TITLE}:')
+            y -= self.line_height * 2
+            pdf.setFont(font, self.font_size)
+            for name, measurement_unit, amount in rows:
+                if y < self.margin:
+                    pdf.showPage()
+                    pdf.setFont(font, self.font_size)
+                    y = height - self.margin
+                pdf.drawString(
+                    self.margin, y,
+                    f'{name.capitalize()} ({measurement_unit}) — {amount}'
+                )
+                y -= self.line_height
+            pdf.save()
+            file.seek(0)
+            while True:
+                chunk = file.read(PDF_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
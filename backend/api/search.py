@@ -0,0 +1,279 @@
+import re
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from collections.abc import Sequence
+from itertools import groupby
+from operator import itemgetter
+from threading import Lock
+
+from recipes.models import Ingredient, IngredientsList, Recipes
+
+from .cache import (VersionedValue, ingredients_generation,
+                    recipes_journal, recipes_search_generation)
+
+WORD = re.compile(r'\w+')
+# Те же веса, что у ts_rank для категорий A, B и C.
+NAME_WEIGHT, INGREDIENT_WEIGHT, TEXT_WEIGHT = 1.0, 0.4, 0.2
+
+
+def trigrams(value):
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов в памяти процесса.
+
+    Используется вместо pg_trgm на базах без него (SQLite в тестах и при
+    локальной разработке): префиксы ищутся бинарным поиском по
+    отсортированным названиям, подстроки — по триграммам. Перестраивается
+    при смене версии ingredients_generation.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+
+    def build(self):
+        rows = sorted(
+            (name.lower(), pk)
+            for pk, name in Ingredient.objects.values_list('pk', 'name')
+        )
+        postings = {}
+        for position, (name, pk) in enumerate(rows):
+            for trigram in trigrams(name):
+                postings.setdefault(trigram, []).append(position)
+        self.rows = rows
+        self.keys = [name for name, pk in rows]
+        self.postings = postings
+
+    def search(self, value, limit):
+        value = value.lower()
+        version = ingredients_generation.get()
+        with self.lock:
+            if self.version != version:
+                self.build()
+                self.version = version
+            rows, keys, postings = self.rows, self.keys, self.postings
+        result = []
+        start = bisect_left(keys, value)
+        position = start
+        while (position < len(keys) and keys[position].startswith(value)
+               and len(result) < limit):
+            result.append(rows[position][1])
+            position += 1
+        if len(result) >= limit:
+            return result
+        if len(value) < 3:
+            candidates = range(len(rows))
+        else:
+            candidates = None
+            for trigram in trigrams(value):
+                found = postings.get(trigram, ())
+                candidates = (set(found) if candidates is None
+                              else candidates.intersection(found))
+                if not candidates:
+                    return result
+            candidates = sorted(candidates)
+        for position in candidates:
+            name = keys[position]
+            if value in name and not name.startswith(value):
+                result.append(rows[position][1])
+                if len(result) >= limit:
+                    break
+        return result
+
+
+ingredient_index = IngredientIndex()
+
+
+def words(value):
+    return WORD.findall(value.lower())
+
+
+def build_recipe_postings():
+    postings = defaultdict(lambda: defaultdict(float))
+    for pk, name, text in Recipes.objects.values_list(
+        'pk', 'name', 'text'
+    ).iterator():
+        for word in words(name):
+            postings[word][pk] += NAME_WEIGHT
+        for word in words(text):
+            postings[word][pk] += TEXT_WEIGHT
+    for pk, name in IngredientsList.objects.values_list(
+        'recipe', 'ingredients__name'
+    ).iterator():
+        for word in words(name):
+            postings[word][pk] += INGREDIENT_WEIGHT
+    return {word: dict(scores) for word, scores in postings.items()}
+
+
+class RecipeIndex:
+    """Обратный индекс рецептов в памяти процесса.
+
+    Замена полнотекстового поиска PostgreSQL на других базах: рецепт
+    находится, если содержит все слова запроса, и ранжируется по сумме
+    весов слов из названия, ингредиентов и описания.
+    """
+
+    def __init__(self):
+        self.postings = VersionedValue(
+            recipes_search_generation, build_recipe_postings
+        )
+
+    def search(self, value, limit):
+        _, postings = self.postings.get()
+        scores = None
+        for word in set(words(value)):
+            found = postings.get(word, {})
+            if scores is None:
+                scores = dict(found)
+            else:
+                scores = {pk: score + found[pk]
+                          for pk, score in scores.items() if pk in found}
+            if not scores:
+                return []
+        if scores is None:
+            return []
+        return sorted(scores, key=lambda pk: (-scores[pk], -pk))[:limit]
+
+
+recipe_index = RecipeIndex()
+
+
+class CookableIndex:
+    """Обратный индекс «ингредиент → рецепты» в памяти процесса.
+
+    Списки рецептов хранятся в отсортированных array('I'), а число
+    ингредиентов рецепта — в array('H') по id рецепта, поэтому индекс на
+    100 тысяч рецептов занимает единицы мегабайт. Изменения рецептов
+    приходят через recipes_journal и применяются по одному рецепту;
+    полная перестройка нужна только при первом обращении или разрыве
+    журнала.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.position = None
+        self.postings = {}
+        self.recipes = {}
+        self.sizes = array('H')
+
+    def build(self, rows):
+        """rows — пары (рецепт, ингредиент), упорядоченные по рецепту."""
+        self.postings = {}
+        self.recipes = {}
+        self.sizes = array('H')
+        for recipe, items in groupby(rows, key=itemgetter(0)):
+            self.add(recipe, [item[1] for item in items], append=True)
+
+    def load(self):
+        self.build(IngredientsList.objects.order_by(
+            'recipe_id', 'ingredients_id'
+        ).values_list('recipe', 'ingredients').iterator(chunk_size=10000))
+
+    def remove(self, recipe):
+        for ingredient in self.recipes.pop(recipe, ()):
+            posting = self.postings[ingredient]
+            del posting[bisect_left(posting, recipe)]
+            if not posting:
+                del self.postings[ingredient]
+        if recipe < len(self.sizes):
+            self.sizes[recipe] = 0
+
+    def add(self, recipe, ingredients, append=False):
+        # append=True — рецепты идут по возрастанию id, вставка не нужна.
+        ingredients = array('I', sorted(set(ingredients)))
+        if not ingredients:
+            return
+        self.recipes[recipe] = ingredients
+        if recipe >= len(self.sizes):
+            self.sizes.extend(bytes(recipe + 1 - len(self.sizes)))
+        self.sizes[recipe] = len(ingredients)
+        for ingredient in ingredients:
+            posting = self.postings.setdefault(ingredient, array('I'))
+            if append:
+                posting.append(recipe)
+            else:
+                insort(posting, recipe)
+
+    def apply(self, recipe_ids):
+        recipe_ids = set(recipe_ids)
+        rows = IngredientsList.objects.filter(
+            recipe__in=recipe_ids
+        ).order_by('recipe_id').values_list('recipe', 'ingredients')
+        current = {recipe: [item[1] for item in items]
+                   for recipe, items in groupby(rows, key=itemgetter(0))}
+        for recipe in recipe_ids:
+            self.remove(recipe)
+            self.add(recipe, current.get(recipe, ()))
+
+    def sync(self):
+        position, changed = recipes_journal.since(self.position)
+        if changed is None:
+            self.load()
+        elif changed:
+            self.apply(changed)
+        self.position = position
+
+    def search(self, ingredient_ids, max_missing=None):
+        with self.lock:
+            self.sync()
+            return self.rank(ingredient_ids, max_missing)
+
+    def rank(self, ingredient_ids, max_missing=None):
+        """Рецепты, где есть хотя бы один из ингредиентов."""
+        have = Counter()
+        for ingredient in set(ingredient_ids):
+            have.update(self.postings.get(ingredient, ()))
+        sizes = self.sizes
+        buckets = defaultdict(list)
+        for recipe, count in have.items():
+            missing = sizes[recipe] - count
+            if max_missing is None or missing <= max_missing:
+                # Внутри корзины: больше совпадений, затем новее рецепт.
+                # Ключ упакован в одно число — так сортировка быстрее.
+                buckets[missing].append(
+                    (0xFFFF - count) << 32 | (0xFFFFFFFF - recipe)
+                )
+        return CookableRanking(buckets)
+
+
+class CookableRanking(Sequence):
+    """Ранжированный список пар (рецепт, сколько не хватает).
+
+    Рецепты разложены по числу недостающих ингредиентов, а корзина
+    сортируется только при первом обращении к её элементам: для первых
+    страниц не нужно сортировать все найденные рецепты.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets.items())
+        self.sorted = set()
+        self.total = sum(len(keys) for _, keys in self.buckets)
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, step = index.indices(self.total)
+        result = []
+        offset = 0
+        for missing, keys in self.buckets:
+            if offset >= stop:
+                break
+            if offset + len(keys) > start:
+                if missing not in self.sorted:
+                    keys.sort()
+                    self.sorted.add(missing)
+                result.extend(
+                    (0xFFFFFFFF - (key & 0xFFFFFFFF), missing)
+                    for key in keys[max(start - offset, 0):stop - offset]
+                )
+            offset += len(keys)
+        return result[::step]
+
+
+cookable_index = CookableIndex()
@@ -0,0 +1,136 @@
+import random
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+
+from recipes.counters import reconcile
+from recipes.models import (Favorite, Ingredient, IngredientsList, Recipes,
+                            ShoppingCart, ShoppingCartTotal, Tag, TagRecipe)
+from users.models import Subscribe, User
+
+from .cache import (ingredients_generation, recipes_journal,
+                    recipes_list_generation, users_generation)
+
+SEED_PREFIX = 'seed'
+SEED_IMAGE = 'image/seed.png'
+BATCH_SIZE = 1000
+
+
+def seed_image():
+    if not default_storage.exists(SEED_IMAGE):
+        buffer = BytesIO()
+        Image.new('RGB', (64, 64), 'orange').save(buffer, 'PNG')
+        default_storage.save(SEED_IMAGE, ContentFile(buffer.getvalue()))
+    return SEED_IMAGE
+
+
+def seed_tags(count=3):
+    tags = list(Tag.objects.all())
+    for number in range(len(tags), count):
+        tags.append(Tag.objects.get_or_create(
+            slug=f'{SEED_PREFIX}-tag-{number}',
+            defaults={'name': f'{SEED_PREFIX} тег {number}',
+                      'color': f'#{0x5eed00 + number:06x}'}
+        )[0])
+    return tags
+
+
+def seed_ingredients(count=200):
+    ingredients = list(Ingredient.objects.values_list('pk', flat=True))
+    if len(ingredients) < count:
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=f'{SEED_PREFIX} ингредиент {number}',
+                        measurement_unit='г')
+             for number in range(len(ingredients), count)),
+            ignore_conflicts=True
+        )
+        ingredients_generation.bump()
+        ingredients = list(Ingredient.objects.values_list('pk', flat=True))
+    return ingredients
+
+
+@transaction.atomic
+def seed(users=10, recipes=5, ingredients=6, subscriptions=3, favorites=5,
+         carts=3, random_seed=0):
+    """Наполняет базу тестовыми данными и возвращает созданных авторов.
+
+    users — число новых пользователей, остальные параметры — количества
+    на одного пользователя (рецепты) или на один рецепт (ингредиенты).
+    Пользователи получают уникальные имена, поэтому повторный вызов
+    добавляет новую порцию данных.
+    """
+    rng = random.Random(random_seed)
+    start = User.objects.filter(
+        username__startswith=f'{SEED_PREFIX}_'
+    ).count()
+    User.objects.bulk_create(
+        (User(email=f'{SEED_PREFIX}_{number}@example.com',
+              username=f'{SEED_PREFIX}_{number}',
+              first_name='Имя',
+              last_name='Фамилия',
+              password='!')
+         for number in range(start, start + users)),
+        batch_size=BATCH_SIZE
+    )
+    new_users = User.objects.filter(
+        username__startswith=f'{SEED_PREFIX}_'
+    ).order_by('id')[start:]
+    created = list(new_users)
+    image = seed_image()
+    tags = seed_tags()
+    ingredient_ids = seed_ingredients()
+    Recipes.objects.bulk_create(
+        (Recipes(author=author,
+                 name=f'Рецепт {author.username} {number}',
+                 text='Описание рецепта',
+                 image=image,
+                 cooking_time=rng.randint(5, 120))
+         for author in created for number in range(recipes)),
+        batch_size=BATCH_SIZE
+    )
+    new_recipes = Recipes.objects.filter(author__in=new_users.values('pk'))
+    recipe_ids = list(new_recipes.values_list('pk', flat=True))
+    TagRecipe.objects.bulk_create(
+        (TagRecipe(recipe_id=recipe, tag_id=tag.pk)
+         for recipe in recipe_ids
+         for tag in rng.sample(tags, rng.randint(1, len(tags)))),
+        batch_size=BATCH_SIZE
+    )
+    per_recipe = min(ingredients, len(ingredient_ids))
+    IngredientsList.objects.bulk_create(
+        (IngredientsList(recipe_id=recipe, ingredients_id=ingredient,
+                         amount=rng.randint(1, 500))
+         for recipe in recipe_ids
+         for ingredient in rng.sample(ingredient_ids, per_recipe)),
+        batch_size=BATCH_SIZE
+    )
+    author_ids = [author.pk for author in created]
+    per_user = min(subscriptions + 1, len(author_ids))
+    Subscribe.objects.bulk_create(
+        (Subscribe(user=user, author_id=author)
+         for user in created
+         for author in [author for author in rng.sample(author_ids, per_user)
+                        if author != user.pk][:subscriptions]),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    for model, count in ((Favorite, favorites), (ShoppingCart, carts)):
+        per_user = min(count, len(recipe_ids))
+        model.objects.bulk_create(
+            (model(user=user, recipe_id=recipe)
+             for user in created
+             for recipe in rng.sample(recipe_ids, per_user)),
+            batch_size=BATCH_SIZE
+        )
+    # bulk_create не вызывает сигналы: итоги корзин, поисковые векторы,
+    # счётчики и версии кэшей обновляются отдельно.
+    ShoppingCartTotal.objects.rebuild()
+    new_recipes.update_search_vector()
+    recipes_journal.reset()
+    recipes_list_generation.bump()
+    users_generation.bump()
+    reconcile()
+    return created
@@ -1,10 +1,14 @@
 import base64
+from tempfile import SpooledTemporaryFile
 
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
+from django.conf import settings
 from django.db import transaction
-from django.core.files.base import ContentFile
+from django.db.models import Exists, OuterRef
+from django.core.files import File
+from django.core.files.storage import default_storage
 from djoser.serializers import UserSerializer, UserCreateSerializer
 
 from users.models import Subscribe, User
@@ -13,16 +17,22 @@ from recipes.models import (Recipes,
                             Favorite,
                             ShoppingCart,
                             Ingredient,
-                            IngredientsList)
+                            IngredientsList,
+                            ShoppingCartTotal)
 
-from .constants import MIN_VALUE_FOR_COOKING
+from recipes.images import RENDITIONS, schedule_renditions
 
+from .constants import (BASE64_CHUNK_SIZE, BULK_RECIPES_LIMIT,
+                        MIN_VALUE_FOR_COOKING)
+from .profiling import ProfiledListSerializer, ProfiledSerializerMixin
 
-class MyUserSerializer(UserSerializer):
+
+class MyUserSerializer(ProfiledSerializerMixin, UserSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = User
+        list_serializer_class = ProfiledListSerializer
         fields = [
             'email',
             'id',
@@ -33,6 +43,8 @@ class MyUserSerializer(UserSerializer):
         ]
 
     def get_is_subscribed(self, object):
+        if hasattr(object, 'is_subscribed'):
+            return object.is_subscribed
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -65,23 +77,63 @@ class CreateUserSerializer(UserCreateSerializer):
 
 
 class Base64ImageField(serializers.ImageField):
+    default_error_messages = {
+        'too_large': 'Размер изображения не должен превышать {max_size} МБ.',
+        'invalid_base64': 'Изображение должно быть корректной строкой base64.',
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
+            format, _, imgstr = data.partition(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = File(self.decode(imgstr), name='temp.' + ext)
+        # Остальное (ссылку на текущее изображение, мусор) отклоняет
+        # ImageField с ошибкой 400.
+        if (isinstance(data, File)
+                and data.size > settings.IMAGE_UPLOAD_MAX_SIZE):
+            self.too_large()
         return super().to_internal_value(data)
 
+    def too_large(self):
+        self.fail(
+            'too_large',
+            max_size=round(settings.IMAGE_UPLOAD_MAX_SIZE / 1024 / 1024, 1)
+        )
 
-class TagSerializer(serializers.ModelSerializer):
+    def decode(self, imgstr):
+        """Декодирует base64 частями во временный файл.
+
+        Размер проверяется до декодирования, а крупный файл уходит на диск,
+        поэтому в памяти не появляется вторая полная копия изображения.
+        """
+        if len(imgstr) * 3 // 4 > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.too_large()
+        file = SpooledTemporaryFile(max_size=BASE64_CHUNK_SIZE * 4)
+        try:
+            for start in range(0, len(imgstr), BASE64_CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    imgstr[start:start + BASE64_CHUNK_SIZE], validate=True
+                ))
+        except ValueError:
+            # Неверный base64 (binascii.Error) или символы не из ASCII.
+            file.close()
+            self.fail('invalid_base64')
+        file.seek(0)
+        return file
+
+
+class TagSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
+        list_serializer_class = ProfiledListSerializer
         fields = '__all__'
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(ProfiledSerializerMixin,
+                           serializers.ModelSerializer):
     class Meta:
         model = Ingredient
+        list_serializer_class = ProfiledListSerializer
         fields = ('id', 'name', 'measurement_unit',)
 
 
@@ -98,7 +150,7 @@ class IngredientListSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'measurement_unit', 'amount']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     author = MyUserSerializer(read_only=True)
     tags = TagSerializer(many=True)
     ingredients = IngredientListSerializer(
@@ -109,9 +161,11 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
     image = Base64ImageField()
+    images = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Recipes
+        list_serializer_class = ProfiledListSerializer
         fields = [
             'id',
             'tags',
@@ -121,23 +175,84 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'images',
             'text',
             'cooking_time'
         ]
 
+    def get_images(self, object):
+        """Ссылки на превью; пока они готовятся — на исходное изображение."""
+        if not object.image:
+            return {}
+        request = self.context.get('request')
+        image_url = object.image.url
+        renditions = object.image_renditions or {}
+        urls = {}
+        for rendition in RENDITIONS:
+            url = (default_storage.url(renditions[rendition])
+                   if rendition in renditions else image_url)
+            urls[rendition] = (request.build_absolute_uri(url)
+                               if request else url)
+        return urls
+
     def get_is_favorited(self, object):
+        if hasattr(object, 'is_favorited'):
+            return object.is_favorited
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return object.favorites.filter(user=user).exists()
 
     def get_is_in_shopping_cart(self, object):
+        if hasattr(object, 'is_in_shopping_cart'):
+            return object.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return object.shopping_cart.filter(user=user).exists()
 
 
+class CookableRecipeSerializer(RecipeSerializer):
+    missing = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['missing']
+
+
+class CookableQuerySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False
+    )
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+
+class BulkRecipesSerializer(serializers.Serializer):
+    """Список id рецептов для избранного или корзины (model в контексте).
+
+    Одним запросом проверяет, что рецепты существуют, и узнаёт, какие
+    из них уже в списке: validated_data['recipes'] — {id: уже в списке}.
+    """
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RECIPES_LIMIT
+    )
+
+    def validate_recipes(self, value):
+        value = list(dict.fromkeys(value))
+        listed = dict(Recipes.objects.filter(pk__in=value).annotate(
+            listed=Exists(self.context['model'].objects.filter(
+                user=self.context['request'].user, recipe=OuterRef('pk')
+            ))
+        ).order_by().values_list('pk', 'listed'))
+        missing = [str(pk) for pk in value if pk not in listed]
+        if missing:
+            raise ValidationError(
+                f'Рецептов не существует: {", ".join(missing)}'
+            )
+        return {pk: listed[pk] for pk in value}
+
+
 class AddingRecipeList(serializers.ModelSerializer):
     id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
 
@@ -225,16 +340,27 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         recipe = Recipes.objects.create(author=author, **validated_data)
         recipe.tags.set(tags)
         self.create_ingredient(ingredients, recipe)
+        schedule_renditions(recipe)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
+        cart_users = list(ShoppingCart.objects.filter(
+            recipe=instance
+        ).values_list('user', flat=True))
+        ShoppingCartTotal.objects.remove_recipe(instance, cart_users)
         IngredientsList.objects.filter(recipe=instance).delete()
         instance.tags.set(tags)
         self.create_ingredient(ingredients, instance)
-        return super().update(instance, validated_data)
+        ShoppingCartTotal.objects.add_recipe(instance, cart_users)
+        if 'image' in validated_data:
+            validated_data['image_renditions'] = {}
+        recipe = super().update(instance, validated_data)
+        if 'image' in validated_data:
+            schedule_renditions(recipe)
+        return recipe
 
     def to_representation(self, instance):
         return RecipeSerializer(instance, context={
@@ -242,9 +368,11 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         }).data
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(ProfiledSerializerMixin,
+                         serializers.ModelSerializer):
     class Meta:
         model = Favorite
+        list_serializer_class = ProfiledListSerializer
         fields = ('user', 'recipe')
 
     def validate(self, data):
@@ -265,13 +393,15 @@ class ShoppingListSerializer(FavoriteSerializer):
         model = ShoppingCart
 
 
-class SubscribeSerializer(serializers.ModelSerializer):
+class SubscribeSerializer(ProfiledSerializerMixin,
+                          serializers.ModelSerializer):
     recipes = serializers.SerializerMethodField(read_only=True)
     recipes_count = serializers.SerializerMethodField(read_only=True)
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = User
+        list_serializer_class = ProfiledListSerializer
         fields = (
             'email',
             'id',
@@ -284,6 +414,10 @@ class SubscribeSerializer(serializers.ModelSerializer):
         )
 
     def get_recipes(self, object):
+        if hasattr(object, 'recipes_preview'):
+            return RecipeInfoSerializer(
+                object.recipes_preview, many=True
+            ).data
         request = self.context.get('request')
         limit = request.GET.get('recipes_limit')
         queryset = object.recipes.all()
@@ -292,10 +426,12 @@ class SubscribeSerializer(serializers.ModelSerializer):
         return RecipeInfoSerializer(queryset, many=True).data
 
     def get_is_subscribed(self, object):
+        if hasattr(object, 'is_subscribed'):
+            return object.is_subscribed
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return Subscribe.objects.filter(user=user, author=object.id).exists()
 
     def get_recipes_count(self, object):
-        return object.recipes.count()
+        return object.recipes_count
@@ -0,0 +1,107 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from recipes.models import (Favorite, Ingredient, IngredientsList, Recipes,
+                            ShoppingCart, Tag)
+from recipes.signals import bulk_change
+from users.models import Subscribe, User
+
+from .cache import (ingredients_generation, recipe_responses, recipes_journal,
+                    tags_generation, users_generation)
+from .overlay import user_flags
+
+# Поля автора, которые попадают в ответы с рецептами.
+USER_PUBLIC_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+def recipe_changed(recipe_id):
+    def record():
+        recipes_journal.record(recipe_id)
+        recipe_responses.invalidate(recipe_id)
+
+    transaction.on_commit(record)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tags_generation(sender, **kwargs):
+    # После фиксации: иначе чтение, начатое до неё, соберёт каталог из
+    # старых данных и сохранит его под новой версией.
+    transaction.on_commit(tags_generation.bump)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_ingredients_generation(sender, **kwargs):
+    transaction.on_commit(ingredients_generation.bump)
+
+
+@receiver(post_save, sender=Recipes)
+@receiver(post_delete, sender=Recipes)
+def record_recipe_change(sender, instance, **kwargs):
+    recipe_changed(instance.pk)
+
+
+@receiver(post_save, sender=IngredientsList)
+@receiver(post_delete, sender=IngredientsList)
+def record_recipe_ingredients_change(sender, instance, **kwargs):
+    recipe_changed(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipes.tags.through)
+def record_recipe_tags_change(sender, instance, action, reverse, pk_set,
+                              **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        recipe_changed(instance.pk)
+    elif pk_set:
+        for recipe_id in pk_set:
+            recipe_changed(recipe_id)
+    else:
+        # tag.recipes.clear(): затронутые рецепты неизвестны.
+        transaction.on_commit(tags_generation.bump)
+
+
+@receiver(pre_save, sender=User)
+def remember_public_fields(sender, instance, update_fields=None, **kwargs):
+    # Вход в систему сохраняет только last_login, регистрация создаёт
+    # пользователя без рецептов: ответы с рецептами не меняются.
+    if instance.pk is None or (
+        update_fields is not None
+        and not USER_PUBLIC_FIELDS & set(update_fields)
+    ):
+        return
+    instance._public_fields = User.objects.filter(
+        pk=instance.pk
+    ).values(*USER_PUBLIC_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def bump_users_generation(sender, instance, **kwargs):
+    """Сбрасывает ответы с рецептами, если изменились поля автора.
+
+    Смена пароля или прав их не трогает. Удалить пользователя с
+    рецептами нельзя (PROTECT), поэтому удаление тоже не сбрасывает.
+    """
+    previous = instance.__dict__.pop('_public_fields', None)
+    if previous is not None and any(
+        previous[field] != getattr(instance, field)
+        for field in USER_PUBLIC_FIELDS
+    ):
+        transaction.on_commit(users_generation.bump)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscribe)
+@receiver(post_delete, sender=Subscribe)
+def invalidate_user_flags(sender, instance, **kwargs):
+    if bulk_change.get():
+        return
+    user_id = instance.user_id
+    transaction.on_commit(lambda: user_flags.invalidate(user_id))
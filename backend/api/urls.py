@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
@@ -21,3 +22,8 @@ urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
     path('', include('djoser.urls')),
 ]
+
+if settings.API_ASYNC_VIEWS:
+    from . import async_views
+
+    urlpatterns = async_views.urlpatterns(router) + urlpatterns
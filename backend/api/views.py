@@ -1,9 +1,17 @@
+from functools import partial
+
 from django.shortcuts import get_object_or_404  # HttpResponse,
 from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.utils import translate_validation
 from djoser.views import UserViewSet
-from django.db.models import Sum
-from django.http import FileResponse
-from recipes.models import Ingredient, IngredientsList, Recipes, Tag
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, OuterRef, Prefetch, Subquery
+from django.http import Http404, StreamingHttpResponse
+from recipes.counters import change_counters
+from recipes.signals import bulk_changes
+from recipes.models import (Favorite, Ingredient, IngredientsList, Recipes,
+                            ShoppingCart, ShoppingCartTotal, Tag, TagRecipe)
 
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
@@ -12,13 +20,32 @@ from rest_framework.response import Response
 
 from users.models import Subscribe, User
 
+from .cache import (RenderedCache, ingredients_generation, recipe_responses,
+                    tags_generation)
+from .fast import (USER_FIELDS, ingredient_dicts, recipe_dicts,
+                   subscription_dicts, tag_dicts)
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import RecipePagination
+from .overlay import personalize, user_flags
+from .pagination import RankedPagination, RecipePagination, UserPagination
 from .permissios import IsAuthorOrReadOnly
-from .serializers import (FavoriteSerializer, IngredientSerializer,
-                          MyUserSerializer, RecipeCreateSerializer,
-                          RecipeSerializer, ShoppingListSerializer,
-                          SubscribeSerializer, TagSerializer)
+from .renderers import (ShoppingListCSVRenderer, ShoppingListPDFRenderer,
+                        ShoppingListTextRenderer)
+from .search import cookable_index
+from .serializers import (BulkRecipesSerializer, CookableQuerySerializer,
+                          CookableRecipeSerializer, FavoriteSerializer,
+                          IngredientSerializer, MyUserSerializer,
+                          RecipeCreateSerializer, RecipeSerializer,
+                          ShoppingListSerializer, SubscribeSerializer,
+                          TagSerializer)
+
+tags_cache = RenderedCache(
+    'tags', tags_generation,
+    lambda: tag_dicts(Tag.objects.all())
+)
+ingredients_cache = RenderedCache(
+    'ingredients', ingredients_generation,
+    lambda: ingredient_dicts(Ingredient.objects.all())
+)
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
@@ -28,12 +55,22 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return Response(ingredient_dicts(
+                self.filter_queryset(self.get_queryset())
+            ))
+        return ingredients_cache.response(request)
+
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return tags_cache.response(request)
+
 
 class RecipesViewSet(viewsets.ModelViewSet):
     queryset = Recipes.objects.all()
@@ -43,6 +80,83 @@ class RecipesViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
 
+    def get_base_queryset(self):
+        return Recipes.objects.defer('search_vector').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredient',
+                queryset=IngredientsList.objects.select_related(
+                    'ingredients'
+                ).order_by('pk')
+            )
+        )
+
+    def annotate_flags(self, queryset):
+        user = self.request.user
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            ))
+        )
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = self.get_base_queryset()
+        if user.is_anonymous:
+            return queryset.select_related('author')
+        return self.annotate_flags(queryset.prefetch_related(
+            Prefetch('author', queryset=User.objects.annotate(
+                is_subscribed=Exists(Subscribe.objects.filter(
+                    user=user, author=OuterRef('pk')
+                ))
+            ))
+        ))
+
+    def representations(self, ids):
+        """Рецепты из общего кэша; у пользователя — с его отметками."""
+        representations = recipe_responses.representations(
+            self.request, ids, partial(recipe_dicts, self.request)
+        )
+        recipes = [representations[pk] for pk in ids if pk in representations]
+        if self.request.user.is_anonymous:
+            return recipes
+        flags = user_flags.get(self.request.user.pk)
+        return [personalize(recipe, flags) for recipe in recipes]
+
+    def list_page(self, request):
+        # Из базы читаются только id страницы, остальное — из кэша.
+        queryset = Recipes.objects.only('pk', 'pub_date')
+        if request.user.is_authenticated:
+            queryset = self.annotate_flags(queryset)
+        page = self.paginate_queryset(self.filter_queryset(queryset))
+        return self.get_paginated_response(
+            self.representations([recipe.pk for recipe in page])
+        )
+
+    def detail_page(self, pk):
+        recipes = self.representations([int(pk)] if pk.isdigit() else [])
+        if not recipes:
+            raise Http404
+        return Response(recipes[0])
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_anonymous:
+            return recipe_responses.list(
+                request, partial(self.list_page, request)
+            )
+        return self.list_page(request)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs['pk']
+        if request.user.is_anonymous:
+            return recipe_responses.detail(
+                request, pk, partial(self.detail_page, pk)
+            )
+        return self.detail_page(pk)
+
     def create(self, request):
         if request.user.is_anonymous:
             return Response(status=status.HTTP_401_UNAUTHORIZED)
@@ -62,6 +176,7 @@ class RecipesViewSet(viewsets.ModelViewSet):
             return RecipeSerializer
         return RecipeCreateSerializer
 
+    @transaction.atomic
     def creating_and_deleting(self, pk, ser_class):
         user = self.request.user
         recipe = get_object_or_404(Recipes, pk=pk)
@@ -74,7 +189,14 @@ class RecipesViewSet(viewsets.ModelViewSet):
                 context={'request': self.request}
             )
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            try:
+                # Повтор, прошедший проверку одновременно с первым запросом,
+                # отсекает уникальное ограничение.
+                with transaction.atomic():
+                    serializer.save()
+            except IntegrityError:
+                return Response({'error': 'Этот рецепт уже добавлен'},
+                                status=status.HTTP_400_BAD_REQUEST)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if self.request.method == 'DELETE':
             if object.exists():
@@ -83,6 +205,56 @@ class RecipesViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Этого рецепта нет в списке'},
                             status=status.HTTP_400_BAD_REQUEST)
 
+    def add_recipes(self, model, ids):
+        model.objects.bulk_create(
+            (model(user=self.request.user, recipe_id=pk) for pk in ids),
+            ignore_conflicts=True
+        )
+        self.bulk_changed(model, ids, 1)
+
+    def remove_recipes(self, model, ids):
+        # Обработчики отдельных строк отключены: счётчики, итоги корзины и
+        # кэш отметок обновляет bulk_changed.
+        with bulk_changes():
+            model.objects.filter(
+                user=self.request.user, recipe__in=ids
+            ).delete()
+        self.bulk_changed(model, ids, -1)
+
+    def bulk_changed(self, model, ids, delta):
+        if not ids:
+            return
+        user_id = self.request.user.pk
+        if model is ShoppingCart:
+            change_counters(Recipes, ids, 'in_carts_count', delta)
+            if delta > 0:
+                ShoppingCartTotal.objects.add_recipes(ids, [user_id])
+            else:
+                ShoppingCartTotal.objects.remove_recipes(ids, [user_id])
+        else:
+            change_counters(Recipes, ids, 'favorites_count', delta)
+        transaction.on_commit(lambda: user_flags.invalidate(user_id))
+
+    @transaction.atomic
+    def bulk_creating_and_deleting(self, model):
+        """POST добавляет, DELETE убирает рецепты из тела {"recipes": [id]}.
+
+        В ответе — id, которые действительно добавлены или убраны.
+        """
+        serializer = BulkRecipesSerializer(
+            data=self.request.data,
+            context={'request': self.request, 'model': model}
+        )
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.validated_data['recipes']
+        if self.request.method == 'POST':
+            ids = [pk for pk, listed in recipes.items() if not listed]
+            self.add_recipes(model, ids)
+            return Response({'added': ids}, status=status.HTTP_201_CREATED)
+        ids = [pk for pk, listed in recipes.items() if listed]
+        self.remove_recipes(model, ids)
+        return Response({'removed': ids})
+
     @action(
         methods=['POST', 'DELETE'],
         detail=True,
@@ -98,48 +270,154 @@ class RecipesViewSet(viewsets.ModelViewSet):
             return Response(status=status.HTTP_401_UNAUTHORIZED)
         return self.creating_and_deleting(pk, ShoppingListSerializer)
 
+    @action(methods=['POST', 'DELETE'], detail=False,
+            url_path='favorite/bulk', url_name='favorite-bulk',
+            permission_classes=(IsAuthenticated,))
+    def favorite_bulk(self, request):
+        return self.bulk_creating_and_deleting(Favorite)
+
+    @action(methods=['POST', 'DELETE'], detail=False,
+            url_path='shopping_cart/bulk', url_name='shopping-cart-bulk',
+            permission_classes=(IsAuthenticated,))
+    def shopping_cart_bulk(self, request):
+        return self.bulk_creating_and_deleting(ShoppingCart)
+
+    @action(methods=['DELETE'], detail=False,
+            url_path='shopping_cart/clear', url_name='shopping-cart-clear',
+            permission_classes=(IsAuthenticated,))
+    @transaction.atomic
+    def clear_shopping_cart(self, request):
+        ids = list(ShoppingCart.objects.filter(
+            user=request.user
+        ).values_list('recipe_id', flat=True))
+        self.remove_recipes(ShoppingCart, ids)
+        return Response({'removed': ids})
+
+    @action(methods=['POST'], detail=False,
+            url_path='shopping_cart/from_favorites',
+            url_name='shopping-cart-from-favorites',
+            permission_classes=(IsAuthenticated,))
+    @transaction.atomic
+    def shopping_cart_from_favorites(self, request):
+        """Добавляет в корзину всё избранное, которого в ней ещё нет."""
+        ids = list(Favorite.objects.filter(user=request.user).exclude(
+            recipe__in=ShoppingCart.objects.filter(
+                user=request.user
+            ).values('recipe')
+        ).values_list('recipe_id', flat=True))
+        self.add_recipes(ShoppingCart, ids)
+        return Response({'added': ids}, status=status.HTTP_201_CREATED)
+
     @action(
         methods=['GET'],
         detail=False,
-        permission_classes=(IsAuthenticated,)
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            ShoppingListTextRenderer,
+            ShoppingListCSVRenderer,
+            ShoppingListPDFRenderer,
+        )
     )
     def download_shopping_cart(self, request):
         if request.user.is_anonymous:
             return Response(status=status.HTTP_401_UNAUTHORIZED)
-        ingredients = (IngredientsList.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).order_by('ingredients__name').values(
-            'ingredients__name', 'ingredients__measurement_unit'
-        ).annotate(amount=Sum('amount')))
-        ingr_list = []
-        ingr_list += 'Список покупок:\n  '
-        for ingredient in ingredients:
-            ingr_list.append(
-                f'\n'
-                f'{ingredient.get("ingredients__name").title()}:  '
-                f'{ingredient.get("amount") }'
-                f'({ingredient.get("ingredients__measurement_unit")}) '
-            )
-        response = FileResponse(
-            ingr_list,
-            content_type='text/plain'
+        ingredients = ShoppingCartTotal.objects.filter(
+            user=request.user
+        ).order_by('ingredient__name').values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        )
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        rows = ingredients.iterator(chunk_size=500)
+        if isinstance(request._request, ASGIRequest):
+            # ASGI-обработчик Django 3.2 перебирает потоковый ответ в цикле
+            # событий, где запросы к базе запрещены: строки читаются сразу.
+            rows = list(ingredients)
+        response = StreamingHttpResponse(
+            renderer.stream(rows),
+            content_type=content_type
         )
         response['Content-Disposition'] = (
-            'attachment; filename=Shopping_List.txt'
+            f'attachment; filename=Shopping_List.{renderer.format}'
         )
         return response
 
+    @action(
+        methods=['GET'],
+        detail=False,
+        pagination_class=RankedPagination,
+    )
+    def cookable(self, request):
+        """Рецепты из имеющихся ингредиентов: сначала те, где всего хватает.
+
+        ?ingredients=1&ingredients=2 — id ингредиентов, ?max_missing=N —
+        не показывать рецепты, где не хватает больше N ингредиентов.
+        """
+        params = {'ingredients': request.query_params.getlist('ingredients')}
+        if 'max_missing' in request.query_params:
+            params['max_missing'] = request.query_params['max_missing']
+        query = CookableQuerySerializer(data=params)
+        query.is_valid(raise_exception=True)
+        ranked = cookable_index.search(
+            query.validated_data['ingredients'],
+            query.validated_data.get('max_missing')
+        )
+        page = self.paginate_queryset(ranked)
+        recipes = self.get_queryset().in_bulk([pk for pk, _ in page])
+        results = []
+        for pk, missing in page:
+            if pk in recipes:
+                recipes[pk].missing = missing
+                results.append(recipes[pk])
+        serializer = CookableRecipeSerializer(
+            results, many=True, context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        url_path='tag_counts',
+        url_name='tag-counts',
+        pagination_class=None,
+    )
+    def tag_counts(self, request):
+        """Теги с числом рецептов, подходящих под остальные фильтры списка.
+
+        Параметр tags не учитывается: count показывает, сколько рецептов
+        станет доступно с этим тегом. Один запрос с GROUP BY по TagRecipe.
+        """
+        params = request.query_params.copy()
+        params.pop('tags', None)
+        queryset = Recipes.objects.all()
+        if request.user.is_authenticated:
+            queryset = self.annotate_flags(queryset)
+        filterset = RecipeFilter(params, queryset=queryset, request=request)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        counts = dict(TagRecipe.objects.filter(
+            recipe__in=filterset.qs.values('pk')
+        ).values('tag').annotate(
+            count=Count('recipe')
+        ).values_list('tag', 'count').order_by())
+        return Response([
+            dict(tag, count=counts.get(tag['id'], 0)) for tag in tag_dicts()
+        ])
+
 
 class SubscribeViewSet(UserViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.order_by('username')
     serializer_class = MyUserSerializer
-    pagination_class = RecipePagination
+    pagination_class = UserPagination
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
 
     @action(
         detail=True,
         methods=['POST', 'DELETE']
     )
+    @transaction.atomic
     def subscribe(self, request, id):
         user = request.user
         author = get_object_or_404(User, id=id)
@@ -175,13 +453,29 @@ class SubscribeViewSet(UserViewSet):
         permission_classes=(permissions.IsAuthenticated,),
     )
     def subscriptions(self, request):
-        queryset = User.objects.filter(authors__user=request.user)
-        serializer = SubscribeSerializer(
-            self.paginate_queryset(queryset),
-            context={'request': request},
-            many=True
+        authors = self.paginate_queryset(self.subscribed_authors())
+        return self.get_paginated_response(
+            subscription_dicts(authors, self.author_recipes(authors))
         )
-        return self.get_paginated_response(serializer.data)
+
+    def subscribed_authors(self):
+        return User.objects.filter(authors__user=self.request.user).only(
+            *USER_FIELDS, 'recipes_count'
+        ).order_by('username')
+
+    def author_recipes(self, authors):
+        """Рецепты авторов страницы, не больше recipes_limit у каждого."""
+        recipes = Recipes.objects.filter(
+            author__in=[author.pk for author in authors]
+        )
+        limit = self.request.query_params.get('recipes_limit')
+        if limit and limit.isdigit():
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipes.objects.filter(
+                    author=OuterRef('author')
+                ).values('pk')[:int(limit)]
+            ))
+        return recipes
 
     def get_permissions(self):
         if self.action == 'me':
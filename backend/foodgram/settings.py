@@ -38,6 +38,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.compression.CompressionMiddleware',
+    'api.profiling.QueryProfileMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -77,7 +79,27 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # Постоянные соединения: воркер не открывает новое на каждый
+        # запрос. Перед запросом соединение проверяется (api/db.py, в
+        # Django 4.1+ этот же ключ обрабатывает сам Django).
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv('CONN_HEALTH_CHECKS', 'True') == 'True',
+        # За PgBouncer в режиме transaction серверные курсоры (iterator())
+        # не работают: DB_POOLER=pgbouncer отключает их.
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_POOLER') == 'pgbouncer',
+    }
+}
+
+# Версии справочников и кэши ответов должны быть общими для всех
+# воркеров: infra/.env указывает на memcached из docker-compose.
+# Без CACHE_BACKEND кэш свой у каждого процесса, и gunicorn.conf.py
+# запускает один воркер.
+CACHES = {
+    'default': {
+        'BACKEND': (os.getenv('CACHE_BACKEND')
+                    or 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
@@ -111,8 +133,29 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.TokenAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Асинхронные обработчики чтения рецептов, тегов, ингредиентов и подписок
+# (api/async_views.py). Включаются в foodgram/asgi.py.
+API_ASYNC_VIEWS = os.getenv('API_ASYNC_VIEWS', 'False') == 'True'
+
+# JSON API: orjson, если установлен, или стандартный json.
+API_JSON_BACKEND = os.getenv('API_JSON_BACKEND', 'orjson')
+# Сжатие ответов JSON и текста от этого размера в байтах: brotli, если он
+# установлен и клиент его принимает, иначе gzip.
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 5))
+
 DJOSER = {
     'SERIALIZERS': {
         'user': 'api.serializers.MyUserSerializer',
@@ -144,3 +187,37 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# Загрузка изображений рецептов: предельный размер файла в байтах,
+# число потоков для подготовки превью и качество WebP.
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv('IMAGE_UPLOAD_MAX_SIZE', 5 * 1024 * 1024))
+IMAGE_RENDITION_WORKERS = int(os.getenv('IMAGE_RENDITION_WORKERS', 2))
+IMAGE_WEBP_QUALITY = int(os.getenv('IMAGE_WEBP_QUALITY', 80))
+# Изображение приходит в JSON строкой base64: тело запроса должно вмещать
+# картинку предельного размера (base64 больше исходника на треть).
+DATA_UPLOAD_MAX_MEMORY_SIZE = IMAGE_UPLOAD_MAX_SIZE * 4 // 3 + 1024 * 1024
+
+# Профилирование запросов к API: при DEBUG — заголовки X-Query-Count и др.,
+# иначе строка JSON в логе api.profiling. Только для разработки и CI:
+# каждый SQL-запрос разбирается для отпечатка.
+API_PROFILING = os.getenv('API_PROFILING', 'False') == 'True'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.profiling': {
+            'handlers': ['console'],
+            'level': os.getenv('API_PROFILING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,45 @@
+# Настройки gunicorn из переменных окружения.
+#
+# GUNICORN_MODE:
+#   sync    — процессы без потоков, по 2 * CPU + 1;
+#   gthread — процессы с потоками (по умолчанию): ожидание БД и кэша
+#             не блокирует весь воркер;
+#   asgi    — воркеры uvicorn и foodgram.asgi:application.
+#
+# С кэшем в памяти процесса (CACHE_BACKEND не задан) воркер по умолчанию
+# один: иначе версии справочников и сброс кэша ответов у воркеров
+# расходятся.
+import multiprocessing
+import os
+
+cpu_count = multiprocessing.cpu_count()
+mode = os.getenv('GUNICORN_MODE', 'gthread')
+
+bind = os.getenv('GUNICORN_BIND', '0:8080')
+wsgi_app = 'foodgram.wsgi:application'
+threads = 1
+
+if mode == 'sync':
+    worker_class = 'sync'
+    default_workers = cpu_count * 2 + 1
+elif mode == 'gthread':
+    worker_class = 'gthread'
+    default_workers = cpu_count + 1
+    threads = int(os.getenv('GUNICORN_THREADS', 4))
+elif mode == 'asgi':
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    wsgi_app = 'foodgram.asgi:application'
+    default_workers = cpu_count
+else:
+    raise ValueError(f'Неизвестный GUNICORN_MODE: {mode}')
+
+if 'locmem' in (os.getenv('CACHE_BACKEND') or 'locmem').lower():
+    default_workers = 1
+
+workers = int(os.getenv('GUNICORN_WORKERS', default_workers))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+# Перезапуск воркеров ограничивает рост памяти процессов.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
@@ -6,6 +6,7 @@ from .models import (Recipes,
                      Ingredient,
                      IngredientsList,
                      Tag,
+                     TagRecipe,
                      Favorite,
                      ShoppingCart)
 
@@ -27,9 +28,16 @@ class IngredientRecipeForm(BaseInlineFormSet):
 class IngredientRecipeInLine(admin.TabularInline):
     model = IngredientsList
     min_num = 1
+    ordering = ('pk',)
     formset = IngredientRecipeForm
 
 
+class TagRecipeInLine(admin.TabularInline):
+    model = TagRecipe
+    min_num = 1
+    ordering = ('pk',)
+
+
 class RecipeAdmin(admin.ModelAdmin):
     list_display = (
         'pk',
@@ -37,11 +45,13 @@ class RecipeAdmin(admin.ModelAdmin):
         'text',
         'author',
         'cooking_time',
-        'pub_date'
+        'pub_date',
+        'favorites_count',
+        'in_carts_count',
     )
     list_editable = ('author', 'name', 'text')
     search_fields = ('name', 'author')
-    inlines = (IngredientRecipeInLine,)
+    inlines = (IngredientRecipeInLine, TagRecipeInLine)
     empty_value_display = '-пусто-'
 
 
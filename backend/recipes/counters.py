@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Subscribe
+
+from .models import Favorite, Recipes, ShoppingCart
+
+User = get_user_model()
+
+# Счётчик: (модель, поле, связанная модель, поле связи).
+COUNTERS = (
+    (Recipes, 'favorites_count', Favorite, 'recipe'),
+    (Recipes, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipes, 'author'),
+    (User, 'followers_count', Subscribe, 'author'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    """Сдвигает счётчик одним UPDATE, без чтения строки."""
+    change_counters(model, [pk], field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    """Сдвигает счётчик сразу у нескольких строк одним UPDATE."""
+    if not pks or not delta:
+        return
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def live_count(related_model, link):
+    return Coalesce(Subquery(
+        related_model.objects.filter(
+            **{link: OuterRef('pk')}
+        ).order_by().values(link).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+def reconcile(check=False):
+    """Сверяет счётчики с данными и, если не check, исправляет их.
+
+    Возвращает число расходящихся строк для каждого счётчика.
+    """
+    drift = {}
+    for model, field, related_model, link in COUNTERS:
+        wrong = model.objects.annotate(
+            live=live_count(related_model, link)
+        ).exclude(**{field: F('live')})
+        drift[f'{model.__name__}.{field}'] = wrong.count()
+        if not check and drift[f'{model.__name__}.{field}']:
+            model.objects.filter(pk__in=wrong.values('pk')).update(
+                **{field: live_count(related_model, link)}
+            )
+    return drift
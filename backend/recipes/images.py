@@ -0,0 +1,70 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image
+
+from api.cache import recipe_responses
+
+logger = logging.getLogger(__name__)
+
+# Максимальные размеры (ширина, высота); None — исходный размер.
+RENDITIONS = {
+    'card': (600, 600),
+    'detail': (1280, 1280),
+    'original': None,
+}
+RENDITIONS_DIR = 'image/renditions/'
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_RENDITION_WORKERS,
+    thread_name_prefix='renditions'
+)
+
+
+def rendition_name(image_name, rendition):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'{RENDITIONS_DIR}{stem}_{rendition}.webp'
+
+
+def make_renditions(recipe_id, image_name):
+    from .models import Recipes
+
+    try:
+        with default_storage.open(image_name) as file:
+            image = Image.open(file)
+            image.load()
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'A' in image.mode else 'RGB')
+            renditions = {}
+            for rendition, size in RENDITIONS.items():
+                copy = image.copy()
+                if size is not None:
+                    copy.thumbnail(size)
+                buffer = BytesIO()
+                copy.save(buffer, 'WEBP', quality=settings.IMAGE_WEBP_QUALITY)
+                renditions[rendition] = default_storage.save(
+                    rendition_name(image_name, rendition),
+                    ContentFile(buffer.getvalue())
+                )
+        if Recipes.objects.filter(pk=recipe_id, image=image_name).update(
+            image_renditions=renditions
+        ):
+            recipe_responses.invalidate(recipe_id)
+    except Exception:
+        logger.exception('Не удалось подготовить превью для %s', image_name)
+    finally:
+        connection.close()
+
+
+def schedule_renditions(recipe):
+    """Готовит превью в фоне после фиксации транзакции."""
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: executor.submit(make_renditions, recipe_id, image_name)
+    )
@@ -1,18 +1,159 @@
 import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management import BaseCommand
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from api.cache import ingredients_generation
 from recipes.models import Ingredient
 
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row
+
+
+def read_json(file):
+    """Читает JSON-массив объектов по частям, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        chunk = file.read(READ_CHUNK_SIZE)
+        buffer += chunk
+        while True:
+            buffer = buffer.lstrip()
+            if not started:
+                if not buffer:
+                    break
+                if buffer[0] != '[':
+                    raise CommandError('Ожидается JSON-массив ингредиентов')
+                buffer = buffer[1:]
+                started = True
+                continue
+            if buffer.startswith((',', ']')):
+                buffer = buffer[1:]
+                continue
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                break
+            buffer = buffer[end:]
+            yield item['name'], item['measurement_unit']
+        if not chunk:
+            if buffer.strip():
+                raise CommandError('Файл JSON обрезан или повреждён')
+            return
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
 
 class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON, пропуская уже имеющиеся.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=settings.BASE_DIR / 'data' / 'ingredients.csv',
+            type=Path,
+            help='Файл .csv (название,единица) или .json.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только прочитать и проверить файл.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        readers = {'.csv': read_csv, '.json': read_json}
+        if path.suffix not in readers:
+            raise CommandError('Поддерживаются только файлы .csv и .json')
+        dry_run = options['dry_run']
+        use_copy = connection.vendor == 'postgresql' and not dry_run
+        start = time.perf_counter()
+        before = Ingredient.objects.count()
+        total = 0
+        with open(path, encoding='UTF-8') as file, transaction.atomic():
+            if use_copy:
+                self.create_staging_table()
+            for batch in batches(readers[path.suffix](file),
+                                 options['batch_size']):
+                self.validate(batch)
+                total += len(batch)
+                if dry_run:
+                    continue
+                if use_copy:
+                    self.copy(batch)
+                else:
+                    self.bulk_create(batch)
+            if use_copy:
+                self.merge_staging_table()
+        elapsed = time.perf_counter() - start
+        created = Ingredient.objects.count() - before
+        if created:
+            ingredients_generation.bump()
+        self.stdout.write(
+            f'Прочитано строк: {total}, добавлено: {created}, '
+            f'{total / elapsed:.0f} строк/с за {elapsed:.2f} с'
+            + (' (пробный запуск)' if dry_run else '')
+        )
+        self.stdout.write('Импорт данных завершен!')
+
+    def validate(self, batch):
+        name_length = Ingredient._meta.get_field('name').max_length
+        unit_length = Ingredient._meta.get_field(
+            'measurement_unit'
+        ).max_length
+        for row in batch:
+            if (len(row) != 2 or not row[0] or len(row[0]) > name_length
+                    or len(row[1]) > unit_length):
+                raise CommandError(f'Некорректная строка: {row}')
+
+    def bulk_create(self, batch):
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=measurement_unit)
+             for name, measurement_unit in batch),
+            ignore_conflicts=True
+        )
+
+    def create_staging_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_load '
+                '(name text, measurement_unit text) ON COMMIT DROP'
+            )
+
+    def copy(self, batch):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                'COPY ingredient_load FROM STDIN WITH (FORMAT csv)', buffer
+            )
 
-    def handle(self, *args, **kwargs):
-        with open('data/ingredients.csv', encoding='UTF-8') as file:
-            for row in csv.reader(file):
-                name, measurement_unit = row
-                Ingredient.objects.create(
-                    name=name,
-                    measurement_unit=measurement_unit
-                )
-            print('Импорт данных завершен!')
+    def merge_staging_table(self):
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT name, measurement_unit FROM ingredient_load '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
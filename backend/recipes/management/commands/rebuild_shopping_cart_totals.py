@@ -0,0 +1,45 @@
+from django.core.management import BaseCommand
+
+from recipes.models import ShoppingCartTotal
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает итоги списков покупок и сверяет их с корзинами.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить итоги, ничего не меняя.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            ShoppingCartTotal.objects.rebuild()
+            self.stdout.write('Итоги списков покупок пересчитаны.')
+        live = {
+            (user, ingredient): amount
+            for user, ingredient, amount
+            in ShoppingCartTotal.objects.live_totals().iterator()
+        }
+        stored = {
+            (user, ingredient): amount
+            for user, ingredient, amount
+            in ShoppingCartTotal.objects.values_list(
+                'user', 'ingredient', 'amount'
+            ).iterator()
+        }
+        mismatches = [
+            key for key in live.keys() | stored.keys()
+            if live.get(key) != stored.get(key)
+        ]
+        for user, ingredient in mismatches[:20]:
+            self.stdout.write(
+                f'user={user} ingredient={ingredient}: '
+                f'в корзинах {live.get((user, ingredient))}, '
+                f'в итогах {stored.get((user, ingredient))}'
+            )
+        if mismatches:
+            self.stderr.write(f'Расхождений: {len(mismatches)}')
+            raise SystemExit(1)
+        self.stdout.write(f'Итоги совпадают: {len(stored)} строк.')
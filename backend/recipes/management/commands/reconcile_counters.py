@@ -0,0 +1,26 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики избранного, корзин, рецептов и подписчиков '
+            'с данными и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить счётчики, ничего не меняя.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = reconcile(check=options['check'])
+        for counter, rows in drift.items():
+            self.stdout.write(f'{counter}: расхождений {rows}')
+        if options['check'] and any(drift.values()):
+            raise SystemExit(1)
+        if not options['check'] and any(drift.values()):
+            self.stdout.write('Счётчики исправлены.')
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def fill_totals(apps, schema_editor):
+    IngredientsList = apps.get_model('recipes', 'IngredientsList')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    totals = IngredientsList.objects.filter(
+        recipe__shopping_cart__isnull=False
+    ).values(
+        'recipe__shopping_cart__user', 'ingredients'
+    ).annotate(total=Sum('amount')).values_list(
+        'recipe__shopping_cart__user', 'ingredients', 'total'
+    ).order_by()
+    ShoppingCartTotal.objects.bulk_create(
+        (ShoppingCartTotal(user_id=user, ingredient_id=ingredient,
+                           amount=amount)
+         for user, ingredient, amount in totals.iterator()),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField()),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to='recipes.ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Итог списка покупок',
+                'verbose_name_plural': 'Итоги списков покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcarttotal',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_cart_total'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # Выражение совпадает с тем, что Django строит для icontains/istartswith.
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm '
+        'ON recipes_ingredient USING gin (UPPER(name::text) gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS recipes_ingredient_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_shoppingcarttotal'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:11
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientsList = apps.get_model('recipes', 'IngredientsList')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep=Min('id'), count=Count('id')).filter(
+        count__gt=1
+    ).order_by()
+    for row in duplicates:
+        extra = Ingredient.objects.filter(
+            name=row['name'], measurement_unit=row['measurement_unit']
+        ).exclude(pk=row['keep'])
+        IngredientsList.objects.filter(ingredients__in=extra).update(
+            ingredients=row['keep']
+        )
+        for total in ShoppingCartTotal.objects.filter(ingredient__in=extra):
+            kept, _ = ShoppingCartTotal.objects.get_or_create(
+                user_id=total.user_id, ingredient_id=row['keep'],
+                defaults={'amount': 0}
+            )
+            ShoppingCartTotal.objects.filter(pk=kept.pk).update(
+                amount=F('amount') + total.amount
+            )
+            total.delete()
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_ingredient_name_trgm'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
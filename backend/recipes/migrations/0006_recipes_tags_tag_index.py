@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX recipes_recipes_tags_tag_recipe_idx '
+            'ON recipes_recipes_tags (tag_id, recipes_id)',
+            'DROP INDEX recipes_recipes_tags_tag_recipe_idx',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipes_tags_tag_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Превью изображения'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_recipes_search_vector '
+        'ON recipes_recipes USING gin (search_vector)'
+    )
+    # То же, что RecipesQuerySet.update_search_vector, для уже
+    # существующих рецептов.
+    schema_editor.execute(
+        "UPDATE recipes_recipes AS recipe SET search_vector = "
+        "setweight(to_tsvector('russian', recipe.name), 'A') || "
+        "setweight(to_tsvector('russian', COALESCE(("
+        "SELECT string_agg(ingredient.name, ' ') "
+        "FROM recipes_ingredientslist AS item "
+        "JOIN recipes_ingredient AS ingredient "
+        "ON ingredient.id = item.ingredients_id "
+        "WHERE item.recipe_id = recipe.id), '')), 'B') || "
+        "setweight(to_tsvector('russian', recipe.text), 'C')"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS recipes_recipes_search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipes_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
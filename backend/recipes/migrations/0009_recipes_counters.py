@@ -0,0 +1,42 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:27
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Recipes = apps.get_model('recipes', 'Recipes')
+    for field, model_name in (('favorites_count', 'Favorite'),
+                              ('in_carts_count', 'ShoppingCart')):
+        model = apps.get_model('recipes', model_name)
+        Recipes.objects.update(**{field: Coalesce(Subquery(
+            model.objects.filter(recipe=OuterRef('pk')).order_by().values(
+                'recipe'
+            ).annotate(total=Count('pk')).values('total')
+        ), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipes_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipes',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(fields=['-favorites_count', '-pub_date'], name='recipes_popular'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
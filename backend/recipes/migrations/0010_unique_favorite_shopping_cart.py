@@ -0,0 +1,62 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:36
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def remove_duplicates(apps, schema_editor):
+    """Оставляет по одной записи на пару (пользователь, рецепт).
+
+    Счётчики рецептов и итоги корзин считали дубли, поэтому у затронутых
+    строк они пересчитываются.
+    """
+    Recipes = apps.get_model('recipes', 'Recipes')
+    IngredientsList = apps.get_model('recipes', 'IngredientsList')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    for field, model_name in (('favorites_count', 'Favorite'),
+                              ('in_carts_count', 'ShoppingCart')):
+        model = apps.get_model('recipes', model_name)
+        duplicates = list(model.objects.values('user', 'recipe').annotate(
+            first=Min('pk'), total=Count('pk')
+        ).filter(total__gt=1).order_by())
+        for row in duplicates:
+            model.objects.filter(
+                user=row['user'], recipe=row['recipe']
+            ).exclude(pk=row['first']).delete()
+            Recipes.objects.filter(pk=row['recipe']).update(
+                **{field: model.objects.filter(recipe=row['recipe']).count()}
+            )
+        if model_name != 'ShoppingCart' or not duplicates:
+            continue
+        users = {row['user'] for row in duplicates}
+        ShoppingCartTotal.objects.filter(user__in=users).delete()
+        ShoppingCartTotal.objects.bulk_create(
+            ShoppingCartTotal(user_id=user, ingredient_id=ingredient,
+                              amount=amount)
+            for user, ingredient, amount in IngredientsList.objects.filter(
+                recipe__shopping_cart__user__in=users
+            ).values(
+                'recipe__shopping_cart__user', 'ingredients'
+            ).annotate(total=Sum('amount')).values_list(
+                'recipe__shopping_cart__user', 'ingredients', 'total'
+            ).order_by()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipes_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_cart'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0010_unique_favorite_shopping_cart'),
+    ]
+
+    # Сначала новые индексы, затем удаление тех, что они заменяют.
+    operations = [
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipes_pub_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipes_author_pub_date'),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='recipes',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AlterField(
+            model_name='recipes',
+            name='pub_date',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcarttotal',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_indexes_for_hot_queries'),
+    ]
+
+    # Сначала новый индекс, затем удаление индекса, который он заменяет.
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredientslist',
+            index=models.Index(fields=['recipe', 'id'], include=('ingredients', 'amount'), name='ingredientslist_recipe'),
+        ),
+        migrations.AlterModelOptions(
+            name='ingredientslist',
+            options={},
+        ),
+        migrations.AlterField(
+            model_name='ingredientslist',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ingredient', to='recipes.recipes'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def copy_to_tag_recipe(apps, schema_editor):
+    Recipes = apps.get_model('recipes', 'Recipes')
+    TagRecipe = apps.get_model('recipes', 'TagRecipe')
+    TagRecipe.objects.bulk_create(
+        (TagRecipe(recipe_id=recipe, tag_id=tag)
+         for recipe, tag in Recipes.tags.through.objects.order_by(
+             'pk'
+         ).values_list('recipes_id', 'tag_id').iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def copy_to_auto_table(apps, schema_editor):
+    Recipes = apps.get_model('recipes', 'Recipes')
+    TagRecipe = apps.get_model('recipes', 'TagRecipe')
+    Recipes.tags.through.objects.bulk_create(
+        (Recipes.tags.through(recipes_id=recipe, tag_id=tag)
+         for recipe, tag in TagRecipe.objects.order_by(
+             'pk'
+         ).values_list('recipe_id', 'tag_id').iterator()),
+        batch_size=BATCH_SIZE
+    )
+    TagRecipe.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    # Поле с through= нельзя получить через AlterField: связи копируются
+    # в recipes_tagrecipe, затем автоматическая таблица удаляется вместе
+    # с полем, и поле добавляется заново уже с through.
+
+    dependencies = [
+        ('recipes', '0012_ingredientslist_explicit_ordering'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='tagrecipe',
+            options={'verbose_name': 'Тег рецепта', 'verbose_name_plural': 'Теги рецептов'},
+        ),
+        migrations.AddIndex(
+            model_name='tagrecipe',
+            index=models.Index(fields=['recipe', 'tag'], name='tagrecipe_recipe_tag'),
+        ),
+        migrations.AlterField(
+            model_name='tagrecipe',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='recipes.recipes'),
+        ),
+        migrations.AlterField(
+            model_name='tagrecipe',
+            name='tag',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='recipes.tag'),
+        ),
+        migrations.RunPython(copy_to_tag_recipe, copy_to_auto_table),
+        # Индекс из 0006 удаляется вместе с таблицей; при откате таблица
+        # создаётся заново без него.
+        migrations.RunSQL(
+            migrations.RunSQL.noop,
+            'CREATE INDEX recipes_recipes_tags_tag_recipe_idx '
+            'ON recipes_recipes_tags (tag_id, recipes_id)',
+        ),
+        migrations.RemoveField(
+            model_name='recipes',
+            name='tags',
+        ),
+        migrations.AddField(
+            model_name='recipes',
+            name='tags',
+            field=models.ManyToManyField(related_name='recipes', through='recipes.TagRecipe', to='recipes.Tag'),
+        ),
+    ]
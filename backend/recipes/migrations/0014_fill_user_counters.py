@@ -0,0 +1,31 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_user_counters(apps, schema_editor):
+    # Миграции users создаются при развёртывании и добавляют счётчики
+    # со значением 0: заполняем их по уже существующим данным.
+    User = apps.get_model('users', 'User')
+    for field, model in (
+        ('recipes_count', apps.get_model('recipes', 'Recipes')),
+        ('followers_count', apps.get_model('users', 'Subscribe')),
+    ):
+        User.objects.update(**{field: Coalesce(Subquery(
+            model.objects.filter(author=OuterRef('pk')).order_by().values(
+                'author'
+            ).annotate(total=Count('pk')).values('total')
+        ), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipes_tags_through_tagrecipe'),
+        # Последняя миграция users: в ней уже есть поля счётчиков.
+        ('users', '__latest__'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_user_counters, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,14 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import (Case, F, OuterRef, Subquery, Sum, Value,
+                              When)
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import MinValueValidator, RegexValidator
 
-from api.constants import MIN_VALUE_FOR_COOKING
+from api.cache import recipes_search_generation
+from api.constants import MIN_VALUE_FOR_COOKING, SEARCH_CONFIG
 
 User = get_user_model()
 
@@ -15,6 +21,10 @@ class Ingredient(models.Model):
         ordering = ('name',)
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'measurement_unit'],
+                                    name='unique_ingredient'),
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
@@ -44,14 +54,41 @@ class Tag(models.Model):
         return f'{self.name}, {self.slug}'
 
 
+class RecipesQuerySet(models.QuerySet):
+    def update_search_vector(self):
+        """Пересчитывает поисковый вектор: название, ингредиенты, описание.
+
+        Вектор хранится только в PostgreSQL; на других базах поиск идёт по
+        индексу в памяти, которому достаточно смены версии.
+        """
+        recipes_search_generation.bump()
+        if connection.vendor != 'postgresql':
+            return 0
+        ingredient_names = IngredientsList.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('ingredients__name', ' ')
+        ).values('names')
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(
+                Coalesce(Subquery(ingredient_names), Value('')),
+                weight='B', config=SEARCH_CONFIG
+            )
+            + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+        ))
+
+
 class Recipes(models.Model):
     name = models.CharField('Название рецепта', max_length=200)
     text = models.TextField('Описание', blank=False)
+    # Индекс по автору — первое поле recipes_author_pub_date.
     author = models.ForeignKey(
         User,
         on_delete=models.PROTECT,
         related_name='recipes',
-        verbose_name='Автор'
+        verbose_name='Автор',
+        db_index=False
     )
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -60,23 +97,52 @@ class Recipes(models.Model):
         verbose_name='Ингредиенты'
     )
     image = models.ImageField(upload_to='image/', null=True, blank=False)
-    tags = models.ManyToManyField(Tag, blank=False, related_name='recipes')
+    image_renditions = models.JSONField(
+        'Превью изображения', default=dict, blank=True, editable=False
+    )
+    tags = models.ManyToManyField(
+        Tag,
+        through='recipes.TagRecipe',
+        blank=False,
+        related_name='recipes'
+    )
     cooking_time = models.PositiveSmallIntegerField(
         validators=[MinValueValidator(MIN_VALUE_FOR_COOKING), ]
     )
-    pub_date = models.DateTimeField(auto_now_add=True, db_index=True,)
+    pub_date = models.DateTimeField(auto_now_add=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, editable=False
+    )
+
+    objects = RecipesQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        # Поля и направления — как в order_by списка, курсора
+        # KeysetPagination и фильтров author и ordering=popular.
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipes_pub_date_id'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='recipes_author_pub_date'),
+            models.Index(fields=['-favorites_count', '-pub_date'],
+                         name='recipes_popular'),
+        ]
 
 
 class IngredientsList(models.Model):
+    # Индекс по рецепту — первое поле ingredientslist_recipe.
     recipe = models.ForeignKey(
         Recipes,
         on_delete=models.CASCADE,
-        related_name='ingredient'
+        related_name='ingredient',
+        db_index=False
     )
     ingredients = models.ForeignKey(
         Ingredient,
@@ -90,37 +156,60 @@ class IngredientsList(models.Model):
     )
 
     class Meta:
-        ordering = ('recipe__name',)
+        # Без ordering: порядок задают запросы, которым он нужен, —
+        # order_by('pk'), то есть порядок добавления в рецепт. Ингредиенты
+        # и количества в индексе: строки рецепта и суммы для корзины
+        # читаются только из индекса (INCLUDE работает в PostgreSQL).
+        indexes = [
+            models.Index(fields=['recipe', 'id'],
+                         include=['ingredients', 'amount'],
+                         name='ingredientslist_recipe'),
+        ]
 
     def __str__(self):
         return f'{self.recipe}, {self.ingredients}, {self.amount}'
 
 
 class TagRecipe(models.Model):
+    # Индекс по тегу — первое поле unique_tag.
     tag = models.ForeignKey(
         Tag,
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False
     )
+    # Индекс по рецепту — первое поле tagrecipe_recipe_tag.
     recipe = models.ForeignKey(
         Recipes,
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False
     )
 
     class Meta:
+        verbose_name = 'Тег рецепта'
+        verbose_name_plural = 'Теги рецептов'
+        # unique_tag (tag, recipe) — для счётчиков рецептов по тегам,
+        # tagrecipe_recipe_tag (recipe, tag) — для фильтра tags (EXISTS по
+        # рецепту) и тегов страницы рецептов.
         constraints = [
             models.UniqueConstraint(fields=['tag', 'recipe'],
                                     name='unique_tag'),
         ]
+        indexes = [
+            models.Index(fields=['recipe', 'tag'],
+                         name='tagrecipe_recipe_tag'),
+        ]
 
     def __str__(self):
         return f'{self.tag} {self.recipe}'
 
 
 class Favorite(models.Model):
+    # Индекс по пользователю — первое поле unique_favorite.
     user = models.ForeignKey(
         User,
         related_name='favorites',
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipes,
@@ -131,15 +220,22 @@ class Favorite(models.Model):
     class Meta:
         verbose_name = 'Избранный рецепт'
         verbose_name_plural = 'Избранные рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_favorite'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} / {self.recipe}'
 
 
 class ShoppingCart(models.Model):
+    # Индекс по пользователю — первое поле unique_shopping_cart.
     user = models.ForeignKey(
         User,
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipes,
@@ -150,6 +246,107 @@ class ShoppingCart(models.Model):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
         default_related_name = 'shopping_cart'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_shopping_cart'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} / {self.recipe}'
+
+
+class ShoppingCartTotalManager(models.Manager):
+    def add_recipe(self, recipe, users):
+        self._apply([recipe], users, 1)
+
+    def remove_recipe(self, recipe, users):
+        self._apply([recipe], users, -1)
+
+    def add_recipes(self, recipes, users):
+        self._apply(recipes, users, 1)
+
+    def remove_recipes(self, recipes, users):
+        self._apply(recipes, users, -1)
+
+    @transaction.atomic
+    def _apply(self, recipes, users, sign):
+        """Сдвигает итоги users на ингредиенты recipes.
+
+        Суммы по ингредиентам считаются одним запросом, итоги меняются
+        одним UPDATE с F-выражением по затронутым ингредиентам.
+        """
+        users = list(users)
+        amounts = IngredientsList.objects.filter(recipe__in=recipes).values(
+            'ingredients'
+        ).annotate(total=Sum('amount')).values_list('ingredients', 'total')
+        amounts = dict(amounts.order_by())
+        if not users or not amounts:
+            return
+        if sign > 0:
+            self.bulk_create(
+                (self.model(user_id=user, ingredient_id=ingredient, amount=0)
+                 for user in users for ingredient in amounts),
+                ignore_conflicts=True
+            )
+        self.filter(user__in=users, ingredient__in=amounts).update(
+            amount=F('amount') + Case(
+                *(When(ingredient=ingredient, then=Value(sign * amount))
+                  for ingredient, amount in amounts.items()),
+                output_field=models.IntegerField()
+            )
+        )
+        if sign < 0:
+            self.filter(user__in=users, amount__lte=0).delete()
+
+    def live_totals(self, users=None):
+        # Одно условие filter(): второй вызов добавил бы ещё один JOIN
+        # по корзинам и задвоил суммы.
+        lookup = ({'recipe__shopping_cart__isnull': False} if users is None
+                  else {'recipe__shopping_cart__user__in': users})
+        return IngredientsList.objects.filter(**lookup).values(
+            'recipe__shopping_cart__user', 'ingredients'
+        ).annotate(total=Sum('amount')).values_list(
+            'recipe__shopping_cart__user', 'ingredients', 'total'
+        ).order_by()
+
+    @transaction.atomic
+    def rebuild(self, users=None):
+        """Пересчитывает итоги всех пользователей или только users."""
+        totals = self.all() if users is None else self.filter(user__in=users)
+        totals.delete()
+        self.bulk_create(
+            (self.model(user_id=user, ingredient_id=ingredient, amount=amount)
+             for user, ingredient, amount
+             in self.live_totals(users).iterator()),
+            batch_size=1000
+        )
+
+
+class ShoppingCartTotal(models.Model):
+    # Индекс по пользователю — первое поле unique_shopping_cart_total.
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        db_index=False
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals'
+    )
+    amount = models.IntegerField()
+
+    objects = ShoppingCartTotalManager()
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ingredient'],
+                                    name='unique_shopping_cart_total'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} / {self.ingredient}: {self.amount}'
@@ -0,0 +1,134 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from api.cache import recipes_search_generation
+from users.models import Subscribe
+
+from .counters import change_counter
+from .models import (Favorite, Ingredient, IngredientsList, Recipes,
+                     ShoppingCart, ShoppingCartTotal, User)
+
+
+# Массовые изменения избранного и корзин (api/views.py) сами сдвигают
+# счётчики и итоги корзины одним запросом на всё изменение, поэтому
+# обработчики отдельных строк на это время отключаются.
+bulk_change = ContextVar('bulk_change', default=False)
+
+
+@contextmanager
+def bulk_changes():
+    token = bulk_change.set(True)
+    try:
+        yield
+    finally:
+        bulk_change.reset(token)
+
+
+def refresh_search_vector(**lookup):
+    # После фиксации транзакции: к этому моменту ингредиенты уже сохранены.
+    transaction.on_commit(
+        lambda: Recipes.objects.filter(**lookup).update_search_vector()
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_cart_totals(sender, instance, created, **kwargs):
+    if created and not bulk_change.get():
+        ShoppingCartTotal.objects.add_recipe(
+            instance.recipe_id, [instance.user_id]
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_cart_totals(sender, instance, **kwargs):
+    if bulk_change.get():
+        return
+    ShoppingCartTotal.objects.remove_recipe(
+        instance.recipe_id, [instance.user_id]
+    )
+
+
+@receiver(post_save, sender=Recipes)
+def refresh_recipe_search_vector(sender, instance, **kwargs):
+    refresh_search_vector(pk=instance.pk)
+
+
+@receiver(post_save, sender=IngredientsList)
+@receiver(post_delete, sender=IngredientsList)
+def refresh_ingredients_search_vector(sender, instance, **kwargs):
+    refresh_search_vector(pk=instance.recipe_id)
+
+
+@receiver(post_save, sender=Ingredient)
+def refresh_ingredient_recipes_search_vector(sender, instance, created,
+                                             **kwargs):
+    if not created:
+        refresh_search_vector(ingredients=instance)
+
+
+@receiver(post_delete, sender=Recipes)
+def bump_search_generation(sender, **kwargs):
+    recipes_search_generation.bump()
+
+
+def counter_delta(signal, created=False):
+    # Счётчик меняется в той же транзакции, что и сама запись: вызывающий
+    # код (сериализаторы, представления, админка) работает внутри atomic.
+    if signal is post_delete:
+        return -1
+    return 1 if created else 0
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def count_favorites(sender, instance, signal, created=False, **kwargs):
+    if bulk_change.get():
+        return
+    change_counter(Recipes, instance.recipe_id, 'favorites_count',
+                   counter_delta(signal, created))
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def count_carts(sender, instance, signal, created=False, **kwargs):
+    if bulk_change.get():
+        return
+    change_counter(Recipes, instance.recipe_id, 'in_carts_count',
+                   counter_delta(signal, created))
+
+
+@receiver(pre_save, sender=Recipes)
+def remember_author(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (
+        update_fields is not None
+        and not {'author', 'author_id'} & set(update_fields)
+    ):
+        return
+    instance._stored_author_id = Recipes.objects.filter(
+        pk=instance.pk
+    ).values_list('author_id', flat=True).first()
+
+
+@receiver(post_save, sender=Recipes)
+@receiver(post_delete, sender=Recipes)
+def count_recipes(sender, instance, signal, created=False, **kwargs):
+    previous = instance.__dict__.pop('_stored_author_id', None)
+    if previous is not None and previous != instance.author_id:
+        # Рецепт передан другому автору, например в списке админки.
+        change_counter(User, previous, 'recipes_count', -1)
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+        return
+    change_counter(User, instance.author_id, 'recipes_count',
+                   counter_delta(signal, created))
+
+
+@receiver(post_save, sender=Subscribe)
+@receiver(post_delete, sender=Subscribe)
+def count_followers(sender, instance, signal, created=False, **kwargs):
+    change_counter(User, instance.author_id, 'followers_count',
+                   counter_delta(signal, created))
@@ -0,0 +1,38 @@
+import pytest
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from api.benchmarks import benchmark_user
+from api.seed import seed
+
+
+@pytest.fixture(autouse=True)
+def clean_cache(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def data(db):
+    """Двенадцать авторов по пять рецептов с подписками, избранным и
+    корзинами."""
+    return seed(users=12)
+
+
+@pytest.fixture
+def user(data):
+    return benchmark_user()
+
+
+@pytest.fixture
+def anonymous_client():
+    return APIClient(SERVER_NAME='localhost')
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient(SERVER_NAME='localhost')
+    client.force_authenticate(user)
+    return client
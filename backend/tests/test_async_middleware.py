@@ -0,0 +1,67 @@
+import asyncio
+from types import ModuleType
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from django.urls import include, path
+
+from api import async_views, urls
+from api.compression import CompressionMiddleware
+from api.profiling import QueryProfileMiddleware
+from api.seed import seed
+
+
+@pytest.fixture
+def async_client(transactional_db, settings):
+    """Клиент ASGI с асинхронными обработчиками, как при API_ASYNC_VIEWS.
+
+    Потоки run_sync работают со своими соединениями, поэтому данные
+    должны быть зафиксированы: transactional_db.
+    """
+    seed(users=3)
+    settings.DEBUG = True
+    settings.API_PROFILING = True
+    urlconf = ModuleType('async_urls')
+    urlconf.urlpatterns = [path('api/', include((
+        async_views.urlpatterns(urls.router) + urls.urlpatterns, 'api'
+    )))]
+    settings.ROOT_URLCONF = urlconf
+    return AsyncClient()
+
+
+def get(client, *args, **kwargs):
+    async def request():
+        return await client.get(*args, **kwargs)
+    return async_to_sync(request)()
+
+
+@pytest.mark.parametrize('middleware', [
+    CompressionMiddleware, QueryProfileMiddleware
+])
+def test_middleware_follows_get_response_mode(middleware):
+    async def get_response(request):
+        pass
+
+    assert asyncio.iscoroutinefunction(middleware(get_response))
+    assert not asyncio.iscoroutinefunction(middleware(lambda request: None))
+
+
+@pytest.mark.parametrize('url, view', [
+    ('/api/tags/', 'TagViewSet.list'),
+    ('/api/recipes/', 'RecipesViewSet.list'),
+])
+def test_async_views_are_profiled(async_client, url, view):
+    response = get(async_client, url)
+    assert response['X-Profile-View'] == view
+    # Запросы к базе выполнены в потоках run_sync.
+    assert int(response['X-Query-Count']) > 0
+
+
+def test_async_response_is_compressed(async_client):
+    # AsyncClient в Django 3.2 передаёт заголовки под их именами.
+    response = get(
+        async_client, '/api/recipes/', {'limit': 50},
+        **{'accept-encoding': 'gzip'}
+    )
+    assert response['Content-Encoding'] == 'gzip'
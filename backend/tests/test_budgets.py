@@ -0,0 +1,41 @@
+import pytest
+
+from api.benchmarks import BUDGETS, measure, percentile
+from recipes.models import Recipes
+
+# Замеров на адрес: p99 по 20 значениям — второй по величине.
+SAMPLES = 20
+
+
+def assert_budget(name, timings, queries):
+    max_queries, max_p99 = BUDGETS[name]
+    assert max(queries) <= max_queries, (
+        f'{name}: {max(queries)} SQL-запросов при бюджете {max_queries}'
+    )
+    p99 = percentile(timings, 99) * 1000
+    assert p99 <= max_p99, f'{name}: p99 {p99:.2f}ms при бюджете {max_p99}ms'
+
+
+def latest_recipe_url():
+    return f'/api/recipes/{Recipes.objects.latest("pub_date").pk}/'
+
+
+@pytest.mark.parametrize('name, url, params', [
+    ('recipes_list', '/api/recipes/', {'limit': 50}),
+    ('recipe_detail', latest_recipe_url, {}),
+    ('subscriptions', '/api/users/subscriptions/',
+     {'limit': 50, 'recipes_limit': 3}),
+    ('download_shopping_cart', '/api/recipes/download_shopping_cart/', {}),
+    # Повторный запрос пользователя: из базы только COUNT и id страницы.
+    ('personalized_cache', '/api/recipes/', {'limit': 50}),
+])
+def test_user_budget(user_client, name, url, params):
+    if callable(url):
+        url = url()
+    assert_budget(name, *measure(user_client, url, SAMPLES, **params))
+
+
+def test_anonymous_cache_budget(data, anonymous_client):
+    assert_budget('anonymous_cache', *measure(
+        anonymous_client, '/api/recipes/', SAMPLES, limit=50
+    ))
@@ -0,0 +1,57 @@
+import pytest
+
+from recipes.counters import reconcile
+from recipes.models import Recipes, ShoppingCart, ShoppingCartTotal
+
+BULK_URL = '/api/recipes/shopping_cart/bulk/'
+
+
+def totals(user):
+    return set(ShoppingCartTotal.objects.filter(user=user).values_list(
+        'user', 'ingredient', 'amount'
+    ))
+
+
+def other_recipes(user, count):
+    return list(Recipes.objects.exclude(shopping_cart__user=user).order_by(
+        'pk'
+    ).values_list('pk', flat=True)[:count])
+
+
+@pytest.mark.parametrize('method', ['post', 'delete'])
+def test_bulk_change_keeps_totals_and_counters(user, user_client, method):
+    ids = other_recipes(user, 3)
+    if method == 'delete':
+        user_client.post(BULK_URL, {'recipes': ids}, format='json')
+    response = getattr(user_client, method)(
+        BULK_URL, {'recipes': ids}, format='json'
+    )
+    assert response.status_code in (200, 201)
+    assert totals(user) == set(
+        ShoppingCartTotal.objects.live_totals([user.pk])
+    )
+    assert not any(reconcile(check=True).values())
+
+
+def test_bulk_remove_query_count(
+    user, user_client, django_assert_max_num_queries
+):
+    ids = other_recipes(user, 4)
+    user_client.post(BULK_URL, {'recipes': ids}, format='json')
+    with django_assert_max_num_queries(20) as one:
+        user_client.delete(BULK_URL, {'recipes': ids[:1]}, format='json')
+    with django_assert_max_num_queries(20) as three:
+        user_client.delete(BULK_URL, {'recipes': ids[1:]}, format='json')
+    assert len(three) == len(one)
+
+
+def test_bulk_clear_updates_flags(
+    user, user_client, django_capture_on_commit_callbacks
+):
+    recipe = ShoppingCart.objects.filter(user=user).first().recipe
+    url = f'/api/recipes/{recipe.pk}/'
+    assert user_client.get(url).json()['is_in_shopping_cart']
+    with django_capture_on_commit_callbacks(execute=True):
+        user_client.delete('/api/recipes/shopping_cart/clear/')
+    assert not user_client.get(url).json()['is_in_shopping_cart']
+    assert not ShoppingCartTotal.objects.filter(user=user).exists()
@@ -0,0 +1,26 @@
+import pytest
+
+from api.cache import ingredients_generation, tags_generation
+from recipes.models import Ingredient, Tag
+
+
+@pytest.mark.parametrize('url, generation, create, key', [
+    ('/api/tags/', tags_generation,
+     lambda: Tag.objects.create(name='Новый', color='#123456', slug='new'),
+     'slug'),
+    ('/api/ingredients/', ingredients_generation,
+     lambda: Ingredient.objects.create(name='new', measurement_unit='г'),
+     'name'),
+])
+def test_catalog_version_changes_after_commit(
+    db, anonymous_client, django_capture_on_commit_callbacks, url,
+    generation, create, key
+):
+    anonymous_client.get(url)
+    version = generation.get()
+    with django_capture_on_commit_callbacks(execute=True):
+        create()
+        # Чтение до фиксации не должно получить новую версию.
+        assert generation.get() == version
+    assert generation.get() != version
+    assert 'new' in [item[key] for item in anonymous_client.get(url).json()]
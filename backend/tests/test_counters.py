@@ -0,0 +1,29 @@
+from recipes.counters import reconcile
+from recipes.models import Recipes
+from users.models import User
+
+
+def test_author_change_moves_recipes_count(data):
+    recipe = Recipes.objects.latest('pub_date')
+    author = recipe.author
+    new_author = User.objects.exclude(pk=author.pk).first()
+    # Так сохраняет рецепт list_editable в админке.
+    recipe.author = new_author
+    recipe.save()
+    author.refresh_from_db()
+    new_author.refresh_from_db()
+    assert author.recipes_count == Recipes.objects.filter(
+        author=author
+    ).count()
+    assert new_author.recipes_count == Recipes.objects.filter(
+        author=new_author
+    ).count()
+    assert not any(reconcile(check=True).values())
+
+
+def test_recipe_edit_keeps_recipes_count(data):
+    recipe = Recipes.objects.latest('pub_date')
+    recipe.name = 'Другое'
+    recipe.save()
+    recipe.save(update_fields=['name'])
+    assert not any(reconcile(check=True).values())
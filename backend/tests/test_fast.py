@@ -0,0 +1,78 @@
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.benchmarks import normalized
+from api.fast import tag_rows
+from api.serializers import RecipeSerializer, SubscribeSerializer
+from api.views import RecipesViewSet
+from recipes.models import Favorite, Recipes, Tag, TagRecipe
+from users.models import User
+
+# Ответы из api/fast.py должны совпадать с выводом сериализаторов DRF.
+
+
+def drf_request(user, **params):
+    request = Request(
+        APIRequestFactory(SERVER_NAME='localhost').get('/api/', params)
+    )
+    request.user = user or AnonymousUser()
+    return request
+
+
+def drf_recipes(user, ids):
+    request = drf_request(user)
+    recipes = RecipesViewSet(request=request).get_queryset().filter(
+        pk__in=ids
+    )
+    data = RecipeSerializer(
+        recipes, many=True, context={'request': request}
+    ).data
+    return normalized({recipe['id']: recipe for recipe in data})
+
+
+@pytest.fixture(params=['anonymous', 'user'])
+def reader(request, user, anonymous_client, user_client):
+    """(клиент API, пользователь для DRF)."""
+    if request.param == 'anonymous':
+        return anonymous_client, None
+    return user_client, user
+
+
+def test_recipe_list_matches_drf(reader):
+    client, user = reader
+    results = client.get('/api/recipes/', {'limit': 50}).json()['results']
+    assert len(results) == 50
+    assert normalized({recipe['id']: recipe for recipe in results}) == (
+        drf_recipes(user, [recipe['id'] for recipe in results])
+    )
+
+
+def test_recipe_detail_matches_drf(reader, user):
+    # Рецепт из избранного пользователя: у него есть личные отметки.
+    pk = Favorite.objects.filter(user=user).first().recipe_id
+    client, reader_user = reader
+    recipe = client.get(f'/api/recipes/{pk}/').json()
+    assert normalized({pk: recipe}) == drf_recipes(reader_user, [pk])
+
+
+@pytest.mark.parametrize('params', [{}, {'recipes_limit': 2}])
+def test_subscriptions_match_drf(user, user_client, params):
+    response = user_client.get('/api/users/subscriptions/', params)
+    authors = User.objects.filter(authors__user=user).order_by('username')
+    assert response.json()['results'] == SubscribeSerializer(
+        authors, many=True, context={'request': drf_request(user, **params)}
+    ).data
+
+
+def test_recipe_with_tag_missing_from_catalog(data, anonymous_client):
+    recipe = Recipes.objects.latest('pub_date')
+    tag_rows.get()
+    # Транзакция теста не фиксируется, версия тегов не меняется: каталог
+    # tag_rows устарел, как при чтении, пересёкшемся с сохранением тега.
+    tag = Tag.objects.create(name='Новый', color='#123456', slug='new')
+    TagRecipe.objects.create(tag=tag, recipe=recipe)
+    response = anonymous_client.get(f'/api/recipes/{recipe.pk}/')
+    assert response.status_code == 200
+    assert 'new' in [tag['slug'] for tag in response.json()['tags']]
@@ -0,0 +1,44 @@
+import base64
+from io import BytesIO
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from api.serializers import Base64ImageField
+
+
+def png():
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8), 'orange').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('data', [
+    'notanimage', '', 123, 'http://localhost/media/image/seed.png',
+    'data:image/png;base64,не base64',
+])
+def test_invalid_image_is_rejected(data):
+    with pytest.raises(ValidationError):
+        Base64ImageField().run_validation(data)
+
+
+def test_base64_image_is_decoded():
+    data = 'data:image/png;base64,' + base64.b64encode(png()).decode()
+    image = Base64ImageField().run_validation(data)
+    assert image.name == 'temp.png'
+
+
+@pytest.mark.parametrize('upload', [
+    lambda content: 'data:image/png;base64,' + base64.b64encode(
+        content
+    ).decode(),
+    lambda content: SimpleUploadedFile('big.png', content, 'image/png'),
+])
+def test_large_image_is_rejected(settings, upload):
+    content = png()
+    settings.IMAGE_UPLOAD_MAX_SIZE = len(content) - 1
+    with pytest.raises(ValidationError) as error:
+        Base64ImageField().run_validation(upload(content))
+    assert 'МБ' in str(error.value.detail)
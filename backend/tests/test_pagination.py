@@ -0,0 +1,49 @@
+import base64
+import json
+
+import pytest
+
+
+def cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def test_cursor_pages_follow_each_other(data, anonymous_client):
+    first = anonymous_client.get('/api/recipes/', {'cursor': '', 'limit': 6})
+    assert first.status_code == 200
+    second = anonymous_client.get(first.json()['next'])
+    assert second.status_code == 200
+    ids = [recipe['id'] for recipe in first.json()['results']]
+    next_ids = [recipe['id'] for recipe in second.json()['results']]
+    assert len(next_ids) == 6
+    assert not set(ids) & set(next_ids)
+
+
+@pytest.mark.parametrize('position', [
+    ['x', 1],
+    ['2020-01-01T00:00:00+00:00', 'y'],
+    [None, 1],
+    [[], {}],
+    ['2020-01-01T00:00:00+00:00', 10 ** 30],
+    [1],
+])
+def test_forged_recipe_cursor_is_not_found(data, anonymous_client, position):
+    response = anonymous_client.get(
+        '/api/recipes/', {'cursor': cursor(position)}
+    )
+    assert response.status_code == 404
+
+
+def test_forged_subscriptions_cursor_is_not_found(user_client):
+    response = user_client.get(
+        '/api/users/subscriptions/', {'cursor': cursor(['seed_1', 'y'])}
+    )
+    assert response.status_code == 404
+
+
+def test_ordering_is_rejected_with_cursor(data, anonymous_client):
+    response = anonymous_client.get(
+        '/api/recipes/', {'cursor': '', 'ordering': 'popular'}
+    )
+    assert response.status_code == 400
+    assert 'ordering' in response.json()
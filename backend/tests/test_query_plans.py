@@ -0,0 +1,39 @@
+from importlib import import_module
+
+import pytest
+from django.db import connection
+
+from api.management.commands.check_query_plans import (explain, full_scans,
+                                                       hot_queries)
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != 'postgresql',
+    reason='планы проверяются на PostgreSQL, как в продакшене'
+)
+
+QUERIES = hot_queries()
+
+# Индексы, которые миграции создают в RunPython: тесты идут без
+# миграций (--nomigrations).
+INDEXES = (
+    ('0004_ingredient_name_trgm', 'create_trigram_index'),
+    ('0008_recipes_search_vector', 'create_search_index'),
+)
+
+
+@pytest.fixture
+def indexes(db):
+    with connection.schema_editor() as schema_editor:
+        for migration, create in INDEXES:
+            getattr(
+                import_module(f'recipes.migrations.{migration}'), create
+            )(None, schema_editor)
+
+
+@pytest.mark.parametrize('name', [
+    name for name, (query, vendors) in QUERIES.items()
+    if 'postgresql' in vendors
+])
+def test_hot_query_uses_indexes(indexes, name):
+    plan = explain(QUERIES[name][0])
+    assert full_scans(plan) == [], f'{name}:\n{plan}'
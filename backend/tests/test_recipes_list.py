@@ -0,0 +1,20 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+@pytest.mark.parametrize('client_name', ['anonymous_client', 'user_client'])
+def test_recipe_list_queries_do_not_depend_on_page_size(request, data,
+                                                        client_name):
+    client = request.getfixturevalue(client_name)
+    counts = {}
+    for limit in (1, 50):
+        # Без кэша: каждая страница строится из базы целиком.
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/recipes/', {'limit': limit})
+        assert response.status_code == 200
+        assert len(response.json()['results']) == limit
+        counts[limit] = len(queries)
+    assert counts[1] == counts[50]
@@ -0,0 +1,40 @@
+from api.cache import users_generation
+from recipes.models import Recipes
+
+
+def test_password_change_keeps_recipe_responses(
+    user, django_capture_on_commit_callbacks
+):
+    version = users_generation.get()
+    with django_capture_on_commit_callbacks(execute=True):
+        user.set_password('new-password-123')
+        user.save()
+        user.save(update_fields=['last_login'])
+    assert users_generation.get() == version
+
+
+def test_author_name_change_resets_recipe_responses(
+    data, anonymous_client, django_capture_on_commit_callbacks
+):
+    recipe = Recipes.objects.latest('pub_date')
+    url = f'/api/recipes/{recipe.pk}/'
+    anonymous_client.get(url)
+    assert anonymous_client.get(url)['X-Cache'] == 'HIT'
+    author = recipe.author
+    with django_capture_on_commit_callbacks(execute=True):
+        author.first_name = 'Другое'
+        author.save()
+    response = anonymous_client.get(url)
+    assert response['X-Cache'] == 'MISS'
+    assert response.json()['author']['first_name'] == 'Другое'
+
+
+def test_popular_list_follows_favorites(data, anonymous_client):
+    params = {'ordering': 'popular', 'limit': 1}
+    anonymous_client.get('/api/recipes/', params)
+    recipe = Recipes.objects.order_by('favorites_count', 'pub_date').first()
+    # Так меняет счётчик добавление в избранное (recipes/signals.py).
+    Recipes.objects.filter(pk=recipe.pk).update(favorites_count=10 ** 6)
+    response = anonymous_client.get('/api/recipes/', params)
+    assert 'X-Cache' not in response
+    assert response.json()['results'][0]['id'] == recipe.pk
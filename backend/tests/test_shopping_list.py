@@ -0,0 +1,47 @@
+import os
+
+import pytest
+import reportlab
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from api.renderers import ShoppingListPDFRenderer
+
+ROWS = [('пшеничная мука', 'г', 500), ('ёжевика', 'шт.', 3)]
+
+needs_font = pytest.mark.skipif(
+    not os.path.exists(settings.SHOPPING_LIST_PDF_FONT),
+    reason='нет шрифта SHOPPING_LIST_PDF_FONT (fonts-dejavu-core)'
+)
+
+
+@needs_font
+def test_pdf_renders_cyrillic_rows():
+    renderer = ShoppingListPDFRenderer()
+    content = b''.join(renderer.stream(ROWS))
+    assert content.startswith(b'%PDF')
+    assert renderer.get_font().encode() in content
+
+
+@needs_font
+def test_pdf_shopping_list_download(user_client):
+    response = user_client.get(
+        '/api/recipes/download_shopping_cart/', {'format': 'pdf'}
+    )
+    assert response.status_code == 200
+    assert b''.join(response.streaming_content).startswith(b'%PDF')
+
+
+def test_missing_font_is_improperly_configured(settings, tmp_path):
+    settings.SHOPPING_LIST_PDF_FONT = str(tmp_path / 'missing.ttf')
+    with pytest.raises(ImproperlyConfigured):
+        ShoppingListPDFRenderer().stream(ROWS)
+
+
+def test_font_without_cyrillic_is_improperly_configured(settings):
+    # Vera из поставки reportlab — только латиница.
+    settings.SHOPPING_LIST_PDF_FONT = os.path.join(
+        os.path.dirname(reportlab.__file__), 'fonts', 'Vera.ttf'
+    )
+    with pytest.raises(ImproperlyConfigured):
+        ShoppingListPDFRenderer().stream(ROWS)
@@ -10,10 +10,13 @@ class UserAdmin(admin.ModelAdmin):
         'username',
         'email',
         'first_name',
-        'last_name'
+        'last_name',
+        'recipes_count',
+        'followers_count',
     )
     search_fields = ('username', 'email')
     list_filter = ('username', 'email')
+    ordering = ('username',)
     empty_value_display = '-пусто-'
 
 
@@ -38,6 +38,12 @@ class User(AbstractUser):
         default=USER,
         max_length=5
     )
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов', default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -45,7 +51,6 @@ class User(AbstractUser):
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
-        ordering = ('username',)
 
     def __str__(self):
         return self.username
@@ -56,11 +61,13 @@ class User(AbstractUser):
 
 
 class Subscribe(models.Model):
+    # Индекс по подписчику — первое поле user_author_unique.
     user = models.ForeignKey(
         User,
         related_name='followers',
         on_delete=models.CASCADE,
-        verbose_name='Подписчик'
+        verbose_name='Подписчик',
+        db_index=False
     )
     author = models.ForeignKey(
         User,